@@ -0,0 +1,109 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#      "pymupdf>=1.25.3",
+# ]
+# ///
+
+# uv run --with pymupdf BatchCheck.py submittals/ -o reports/ --highlight
+
+"""Spell-check many PDFs from the command line, without Streamlit"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from utils.batch import find_pdfs, run_batch
+from utils.pdf import ExtractionProfile
+
+DICT_DIR: Path = Path(__file__).parent / "default_dict"
+
+
+def main() -> int:
+    avl_dicts = sorted(file.stem for file in DICT_DIR.glob("*.txt"))
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "paths", nargs="+", type=Path, help="PDF files or directories of PDFs"
+    )
+    parser.add_argument(
+        "-d",
+        "--dict",
+        dest="dicts",
+        action="append",
+        choices=avl_dicts,
+        help="Dictionary to use (repeatable, default: all)",
+    )
+    parser.add_argument(
+        "-o", "--out", type=Path, default=Path("reports"), help="Output directory"
+    )
+    parser.add_argument(
+        "-f", "--format", choices=["csv", "json"], default="csv", help="Report format"
+    )
+    parser.add_argument(
+        "--highlight", action="store_true", help="Also write highlighted PDFs"
+    )
+    parser.add_argument(
+        "-r", "--recursive", action="store_true", help="Search directories recursively"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="Worker processes (default: CPUs)"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Ignore and don't update the cache"
+    )
+    parser.add_argument(
+        "--clip",
+        metavar="X0,Y0,X1,Y1",
+        help="Only read words inside this rectangle (points from the top-left "
+        "corner of the page), e.g. to leave out the sheet border",
+    )
+    args = parser.parse_args()
+
+    clip = None
+    if args.clip:
+        try:
+            clip = tuple(float(value) for value in args.clip.split(","))
+        except ValueError:
+            parser.error(f"Invalid --clip: {args.clip!r}")
+        if len(clip) != 4 or clip[0] >= clip[2] or clip[1] >= clip[3]:
+            parser.error(f"Invalid --clip: {args.clip!r}")
+
+    try:
+        pdf_paths = find_pdfs(args.paths, recursive=args.recursive)
+    except FileNotFoundError as e:
+        parser.error(f"No such file or directory: {e}")
+    if not pdf_paths:
+        parser.error("No PDF files found")
+
+    dict_files = [DICT_DIR / f"{name}.txt" for name in (args.dicts or avl_dicts)]
+
+    failed = 0
+    for done, result in enumerate(
+        run_batch(
+            pdf_paths,
+            dict_files,
+            args.out,
+            report_format=args.format,
+            highlight=args.highlight,
+            workers=args.jobs,
+            use_cache=not args.no_cache,
+            profile=ExtractionProfile(clip=clip),
+        ),
+        start=1,
+    ):
+        prefix = f"[{done}/{len(pdf_paths)}] {result.pdf_path}"
+        if result.error:
+            failed += 1
+            print(f"{prefix}: FAILED ({result.error})", file=sys.stderr)
+        else:
+            print(
+                f"{prefix}: {result.misspelled} words, {result.occurrences} "
+                f"occurrences -> {result.report_path}"
+            )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@
 # requires-python = ">=3.13"
 # dependencies = [
 #      "pymupdf>=1.25.3",
-#      "streamlit>=1.42.2",
+#      "streamlit>=1.52.0",
 # ]
 # ///
 
@@ -13,9 +13,29 @@ from pathlib import Path
 import pandas as pd
 import streamlit as st
 
-from utils.dictionary import load_dictionaries
+from utils.cache import results_key
+from utils.dictionary import add_words, compile_dictionary, load_compiled_dictionaries
 from utils.html import CSS_STYLE, FOOTER
-from utils.pdf import Pdf
+from utils.instrument import recorder
+from utils.jobs import build_suggestions, job_queue
+from utils.pdf import (
+    Pdf,
+    format_page_ranges,
+    parse_page_ranges,
+)
+from utils.storage import spool_upload, start_cleanup_thread
+from utils.ui import (
+    diagnostics_toggle,
+    document_results,
+    shared_result_cache,
+    show_diagnostics,
+)
+
+result_cache = shared_result_cache()
+start_cleanup_thread()
+
+# Stage timings and counters for this run only; off (and free) by default.
+diagnostics = diagnostics_toggle()
 
 st.markdown(CSS_STYLE, unsafe_allow_html=True)
 
@@ -46,7 +66,17 @@ if not pdf_file:
     st.info("Please upload a PDF file to begin processing")
     st.stop()
 
-pdf: Pdf = Pdf(pdf_file=pdf_file)
+# Keep the Pdf across reruns for its page count and revision info; the words
+# themselves are extracted by the background job and reused through the
+# result cache.
+# The upload is spooled to disk once and opened by path, so the document is
+# not buffered a second time alongside Streamlit's copy.
+if st.session_state.get("pdf_file_id") != pdf_file.file_id:
+    st.session_state.pdf_file_id = pdf_file.file_id
+    digest, pdf_path = spool_upload(pdf_file)
+    if getattr(st.session_state.get("pdf"), "digest", None) != digest:
+        st.session_state.pdf = Pdf(path=pdf_path, digest=digest)
+pdf: Pdf = st.session_state.pdf
 
 st.markdown('<h2 class="sub-header">Dictionary Selection</h2>', unsafe_allow_html=True)
 avl_dict_files: list[Path] = list(
@@ -64,19 +94,57 @@ dict_files = [
     (Path(__file__).parent / "default_dict" / f"{x}.txt") for x in chosen_dicts
 ]
 
+page_selection: str = st.text_input(
+    "Pages to check",
+    placeholder=f"All {pdf.page_count} pages, or e.g. 12-18, 40",
+    help="Check only these pages of a revised set; leave blank to check every page",
+)
+try:
+    pages: list[int] | None = (
+        parse_page_ranges(page_selection, pdf.page_count)
+        if page_selection.strip()
+        else None
+    )
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
+
 if dict_files:
-    with st.spinner("Processing..."):
-        dictionary = load_dictionaries(dict_files)
-        st.caption(f"*Dictionary loaded with {len(dictionary)} words*")
+    dictionary = load_compiled_dictionaries(dict_files)
+    st.caption(f"*Dictionary loaded with {len(dictionary)} words*")
 
-        misspelled_words = pdf.process_pdf(dictionary=dictionary)
+    misspelled_words = document_results(
+        pdf,
+        dictionary,
+        pages,
+        result_cache,
+        results_key(pdf.digest, dict_files, pages),
+        {
+            "MisspelledWord": lambda x: x.original,
+            "Corrected": lambda x: x.cleaned,
+            "Instances": len,
+        },
+    )
 
-        selected_words = set()
+    selected_words = set()
 else:
     st.stop()
 
 st.divider()
 
+# Checked pages of this upload that match no page of an earlier one (a new
+# revision)
+checked_pages: int = len(pages) if pages is not None else pdf.page_count
+changed_pages: set[int] | None = None
+if pdf.changed_pages is not None and len(pdf.changed_pages) < checked_pages:
+    changed_pages = set(pdf.changed_pages)
+    st.info(
+        f"Revision of an earlier upload: {len(changed_pages)} of {checked_pages} "
+        "checked pages changed"
+        + (f" ({format_page_ranges(pdf.changed_pages)})" if changed_pages else "")
+        + ". Unchanged pages reuse their earlier results."
+    )
+
 st.markdown(
     """
     <div class="stInfo">
@@ -109,74 +177,103 @@ if misspelled_words:
         unsafe_allow_html=True,
     )
 
-    df_data = {
-        "Include": [False for _ in range(len(misspelled_words))],
-        "MisspelledWord": [x["original"] for x in misspelled_words],
-        "Corrected": [x["cleaned"] for x in misspelled_words],
-        "Instances": [len(x["pages"]) for x in misspelled_words],
-        "Pages": [
-            ", ".join(map(str, sorted(set(x["pages"])))) for x in misspelled_words
-        ],
-    }
-    df = pd.DataFrame(df_data)
-    user_df = st.data_editor(
-        df,
-        use_container_width=True,
-        hide_index=True,
-        column_config={
-            "Include": st.column_config.CheckboxColumn(
-                "Include?",
-                help="Include word in dictionary update",
-                default=False,
-                width="small",
-            ),
-            "MisspelledWord": st.column_config.TextColumn(
-                "Original Word",
-                width="medium",
-            ),
-            "Corrected": st.column_config.TextColumn(
-                "Cleaned Word",
-                width="medium",
-            ),
-            "Instances": st.column_config.NumberColumn(
-                "Instances",
-                width="small",
-            ),
-            "Pages": st.column_config.TextColumn(
-                "Pages",
-                width="medium",
-            ),
-        },
-    )
+    with recorder().span("results_table", rows=len(misspelled_words)):
+        df_data = {
+            "Include": [False for _ in range(len(misspelled_words))],
+            "MisspelledWord": [x.original for x in misspelled_words],
+            "Corrected": [x.cleaned for x in misspelled_words],
+            "Instances": [len(x) for x in misspelled_words],
+            "Pages": [x.page_list() for x in misspelled_words],
+        }
+        if changed_pages is not None:
+            df_data["New"] = [x.only_on_pages(changed_pages) for x in misspelled_words]
+        found_elsewhere = [
+            ", ".join(dictionary.found_elsewhere(x.cleaned)) for x in misspelled_words
+        ]
+        if any(found_elsewhere):
+            df_data["FoundIn"] = found_elsewhere
+        df = pd.DataFrame(df_data)
+    with recorder().span("data_editor"):
+        user_df = st.data_editor(
+            df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Include": st.column_config.CheckboxColumn(
+                    "Include?",
+                    help="Include word in dictionary update",
+                    default=False,
+                    width="small",
+                ),
+                "MisspelledWord": st.column_config.TextColumn(
+                    "Original Word",
+                    width="medium",
+                ),
+                "Corrected": st.column_config.TextColumn(
+                    "Cleaned Word",
+                    width="medium",
+                ),
+                "Instances": st.column_config.NumberColumn(
+                    "Instances",
+                    width="small",
+                ),
+                "Pages": st.column_config.TextColumn(
+                    "Pages",
+                    width="medium",
+                ),
+                "FoundIn": st.column_config.TextColumn(
+                    "Found In",
+                    help="Dictionaries that are not selected but contain this word",
+                    width="medium",
+                ),
+                "New": st.column_config.CheckboxColumn(
+                    "New?",
+                    help="Only found on pages that changed in this revision",
+                    disabled=True,
+                    width="small",
+                ),
+            },
+        )
 
     st.divider()
     selected = user_df[user_df["Include"]]["Corrected"].to_list()
     if not selected:
         st.info("Select words to add to the dictionary")
-        st.stop()
-
-    st.markdown(
-        '<h3 style="color: #2563EB; margin: 1rem 0;">Update Dictionary</h3>',
-        unsafe_allow_html=True,
-    )
-    dict_to_update = st.selectbox(
-        "Select Dictionary to Update",
-        options=[file.stem for file in avl_dict_files],
-        help="Choose which dictionary to add the selected words to",
-    )
+    else:
+        st.markdown(
+            '<h3 style="color: #2563EB; margin: 1rem 0;">Update Dictionary</h3>',
+            unsafe_allow_html=True,
+        )
+        dict_to_update = st.selectbox(
+            "Select Dictionary to Update",
+            options=[file.stem for file in avl_dict_files],
+            help="Choose which dictionary to add the selected words to",
+        )
 
-    if st.button(
-        "Update Dictionary", help="Add selected words to the chosen dictionary"
-    ):
-        with open(
-            (Path(__file__).parent / "default_dict" / f"{dict_to_update}.txt"), "a"
-        ) as f:
-            f.write("\n" + "\n".join(sorted(selected)))
-        st.success(f"Successfully added {len(selected)} words to {dict_to_update}")
-        st.session_state.clear()
-        st.cache_data.clear()
-        st.cache_resource.clear()
-        st.rerun()
+        if st.button(
+            "Update Dictionary", help="Add selected words to the chosen dictionary"
+        ):
+            dict_path = Path(__file__).parent / "default_dict" / f"{dict_to_update}.txt"
+            added = add_words(dict_path, selected)
+            # Adding words drops the dictionary's suggestion index; rebuild it
+            # now rather than in the next spell check.
+            index_path = compile_dictionary(dict_path)
+            job_queue().submit(
+                f"suggestions:{index_path}", build_suggestions, index_path
+            )
+            if dict_to_update in chosen_dicts:
+                # Carry the results over to the updated dictionary instead of
+                # re-checking the document: just drop the rows that are now valid.
+                now_valid = set(selected)
+                result_cache.put(
+                    results_key(pdf.digest, dict_files, pages),
+                    [x for x in misspelled_words if x.cleaned not in now_valid],
+                )
+            st.success(f"Successfully added {len(added)} words to {dict_to_update}")
+            st.rerun()
 
 else:
     st.info("✅ No potential new words found in the document")
+
+if diagnostics is not None:
+    show_diagnostics(diagnostics)
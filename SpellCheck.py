@@ -2,21 +2,46 @@
 # requires-python = ">=3.13"
 # dependencies = [
 #      "pymupdf>=1.25.3",
-#      "streamlit>=1.42.2",
+#      "streamlit>=1.52.0",
 # ]
 # ///
 
-import csv
-import tempfile
+import hashlib
+import io
 from pathlib import Path
-from typing import Any, Literal
 
 import pandas as pd
 import streamlit as st
 
-from utils.dictionary import load_dictionaries
+from utils.batch import write_zip
+from utils.cache import results_key, suggestions_key
+from utils.dictionary import DictionarySet, load_compiled_dictionaries
 from utils.html import CSS_STYLE, FOOTER
-from utils.pdf import Pdf
+from utils.instrument import recorder
+from utils.jobs import check_documents
+from utils.pdf import (
+    Misspelling,
+    Pdf,
+    format_page_ranges,
+    parse_page_ranges,
+)
+from utils.report import combine_results, split_repeated, write_csv
+from utils.storage import new_temp_path, spool_upload, start_cleanup_thread
+from utils.ui import (
+    diagnostics_toggle,
+    document_results,
+    job_results,
+    run_job,
+    shared_result_cache,
+    show_diagnostics,
+)
+
+result_cache = shared_result_cache()
+start_cleanup_thread()
+
+# Stage timings and counters for this run only; off (and free) by default.
+diagnostics = diagnostics_toggle()
+
 
 st.markdown(CSS_STYLE, unsafe_allow_html=True)
 
@@ -33,16 +58,39 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-pdf_file = st.file_uploader(
-    "Upload PDF", type=["pdf"], help="Upload a PDF file to check for spelling errors"
+pdf_files = st.file_uploader(
+    "Upload PDF",
+    type=["pdf"],
+    accept_multiple_files=True,
+    help="Upload a PDF file to check for spelling errors, or several to check "
+    "them together",
 )
 
-if not pdf_file:
+if not pdf_files:
     st.info("Please upload a PDF file to begin spell checking")
     st.stop()
 
-pdf: Pdf = Pdf(pdf_file=pdf_file)
-
+if len(pdf_files) == 1:
+    pdf_file = pdf_files[0]
+    # Keep the Pdf across reruns for its page count and highlighting; the
+    # words themselves are extracted by the background job and reused
+    # through the result cache.
+    # The upload is spooled to disk once and opened by path, so the document
+    # is not buffered a second time alongside Streamlit's copy.
+    if st.session_state.get("pdf_file_id") != pdf_file.file_id:
+        st.session_state.pdf_file_id = pdf_file.file_id
+        digest, pdf_path = spool_upload(pdf_file)
+        if getattr(st.session_state.get("pdf"), "digest", None) != digest:
+            st.session_state.pdf = Pdf(path=pdf_path, digest=digest)
+    pdf: Pdf = st.session_state.pdf
+else:
+    # Spool each upload once, keyed by its file id; forget removed files.
+    spooled: dict[str, tuple[str, Path]] = {
+        file.file_id: st.session_state.get("spooled", {}).get(file.file_id)
+        or spool_upload(file)
+        for file in pdf_files
+    }
+    st.session_state.spooled = spooled
 st.markdown('<h2 class="sub-header">Dictionary Selection</h2>', unsafe_allow_html=True)
 avl_dict_files: list[Path] = list(
     (Path(__file__).parent / "default_dict").glob("*.txt")
@@ -59,40 +107,255 @@ dict_files: list[Path] = [
     (Path(__file__).parent / "default_dict" / f"{x}.txt") for x in chosen_dicts
 ]
 
+if len(pdf_files) > 1:
+    if not dict_files:
+        st.stop()
+    dictionary = load_compiled_dictionaries(dict_files)
+    st.caption(f"*Dictionary loaded with {len(dictionary)} words*")
+
+    # (name, spooled path, digest) per upload; repeated names get a suffix.
+    documents: list[tuple[str, Path, str]] = []
+    for file in pdf_files:
+        name, copy = file.name, 1
+        while name in {x[0] for x in documents}:
+            copy += 1
+            name = f"{Path(file.name).stem} ({copy}){Path(file.name).suffix}"
+        digest, pdf_path = spooled[file.file_id]
+        documents.append((name, pdf_path, digest))
+
+    # One job checks every file, one file per worker process, so the set
+    # takes about as long as its largest file.
+    set_digest = hashlib.sha256(
+        "".join(f"{name}\n{digest}\n" for name, _, digest in documents).encode()
+    ).hexdigest()
+    job_key = results_key(set_digest, dict_files)
+
+    def show_status(
+        results: dict[str, list[Misspelling]], errors: dict[str, str] | None = None
+    ):
+        errors = errors or {}
+        st.dataframe(
+            pd.DataFrame(
+                {
+                    "File": [name for name, _, _ in documents],
+                    "Status": [
+                        f"Failed: {errors[name]}"
+                        if name in errors
+                        else "Checked"
+                        if name in results
+                        else "Checking..."
+                        for name, _, _ in documents
+                    ],
+                    "Misspelled Words": [
+                        len(results[name]) if name in results else None
+                        for name, _, _ in documents
+                    ],
+                }
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    def show_partial(results: dict[str, list[Misspelling]]):
+        show_status(results)
+        if combined := combine_results(results):
+            st.dataframe(
+                pd.DataFrame(
+                    {
+                        "MisspelledWord": [x.original for x in combined],
+                        "Instances": [len(x) for x in combined],
+                        "Pages": [x.page_list() for x in combined],
+                    }
+                ),
+                use_container_width=True,
+                hide_index=True,
+            )
+
+    job = run_job(
+        job_key,
+        check_documents,
+        documents,
+        dict_files,
+        None,
+        result_cache,
+        suggestions_key(job_key),
+        show_partial=show_partial,
+    )
+    # Each file's words are read back from the result cache, in upload order.
+    errors: dict[str, str] = job.result
+    checked = [(name, digest) for name, _, digest in documents if name not in errors]
+    keys = [results_key(digest, dict_files) for _, digest in checked]
+    results: dict[str, list[Misspelling]] = {
+        name: words
+        for (name, _), words in zip(checked, job_results(job, result_cache, keys))
+    }
+    show_status(results, errors)
+    combined = combine_results(results)
+
+    st.divider()
+    if combined:
+        st.markdown(
+            f'<h2 class="sub-header">Results - {len(combined)} Misspelled Words '
+            f"Found in {len(results)} Files</h2>",
+            unsafe_allow_html=True,
+        )
+        # Found by the job, so building a suggestion index never blocks the page
+        found = result_cache.get(suggestions_key(job_key)) or {}
+        suggestions = [", ".join(found.get(x.cleaned, [])) for x in combined]
+        user_df = st.data_editor(
+            pd.DataFrame(
+                {
+                    "Include": [False for _ in range(len(combined))],
+                    "MisspelledWord": [x.original for x in combined],
+                    "Suggestions": suggestions,
+                    "Instances": [len(x) for x in combined],
+                    "Files": [len(x.documents) for x in combined],
+                    "Pages": [x.page_list() for x in combined],
+                }
+            ),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Include": st.column_config.CheckboxColumn(
+                    "Include?",
+                    help="Include results in export",
+                    default=False,
+                    width="small",
+                ),
+                "MisspelledWord": st.column_config.TextColumn(
+                    "Misspelled Word", width="medium"
+                ),
+                "Suggestions": st.column_config.TextColumn(
+                    "Suggestions",
+                    help="Closest dictionary words (up to two edits away)",
+                    width="medium",
+                ),
+                "Instances": st.column_config.NumberColumn("Instances", width="small"),
+                "Files": st.column_config.NumberColumn("Files", width="small"),
+                "Pages": st.column_config.TextColumn(
+                    "Pages",
+                    help="Pages in each file",
+                    width="large",
+                ),
+            },
+        )
+
+        chosen = [combined[_idx] for _idx in user_df[user_df["Include"]].index]
+        if chosen and st.button(
+            "📦 Export ZIP",
+            help="Download a CSV and a highlighted PDF per file, plus a "
+            "combined CSV, for the selected words",
+        ):
+            chosen_by_file: dict[str, list[Misspelling]] = {}
+            for entry in chosen:
+                for name, occurrences in entry.documents.items():
+                    chosen_by_file.setdefault(name, []).append(occurrences)
+            zip_path = new_temp_path(".zip")
+            with st.spinner("Highlighting..."), open(zip_path, "wb") as f:
+                write_zip(
+                    f,
+                    [
+                        (name, pdf_path, chosen_by_file.get(name, []))
+                        for name, pdf_path, _ in documents
+                        if name in results
+                    ],
+                )
+            # Read only when the user clicks, instead of being copied into
+            # Streamlit's in-memory media store on every render
+            st.download_button(
+                label="Download ZIP",
+                data=zip_path.read_bytes,
+                file_name="misspelled_words.zip",
+                mime="application/zip",
+            )
+    elif results:
+        st.info("✅ No misspelled words found in the documents")
+
+    if diagnostics is not None:
+        show_diagnostics(diagnostics)
+    st.stop()
+
+page_selection: str = st.text_input(
+    "Pages to check",
+    placeholder=f"All {pdf.page_count} pages, or e.g. 12-18, 40",
+    help="Check only these pages of a revised set; leave blank to check every page",
+)
+try:
+    pages: list[int] | None = (
+        parse_page_ranges(page_selection, pdf.page_count)
+        if page_selection.strip()
+        else None
+    )
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
+
 
 if dict_files:
-    with st.spinner("Processing..."):
-        dictionary: set[str] = load_dictionaries(dict_files)
-        st.caption(f"*Dictionary loaded with {len(dictionary)} words*")
-
-        misspelled_words: list[
-            dict[
-                tuple[str, str],
-                dict[Literal["original", "cleaned", "pages", "locations"], Any],
-            ]
-        ] = pdf.process_pdf(dictionary=dictionary)
-
-        selected_words: set[str] = set()
+    dictionary: DictionarySet = load_compiled_dictionaries(dict_files)
+    st.caption(f"*Dictionary loaded with {len(dictionary)} words*")
+
+    cache_key = results_key(pdf.digest, dict_files, pages)
+    misspelled_words: list[Misspelling] = document_results(
+        pdf,
+        dictionary,
+        pages,
+        result_cache,
+        cache_key,
+        {"MisspelledWord": lambda x: x.original, "Instances": len},
+        suggestions_key(cache_key),
+    )
+
+    selected_words: set[str] = set()
 else:
     st.stop()
 
 st.divider()
 
+# Checked pages of this upload that match no page of an earlier one (a new
+# revision)
+checked_pages: int = len(pages) if pages is not None else pdf.page_count
+changed_pages: set[int] | None = None
+if pdf.changed_pages is not None and len(pdf.changed_pages) < checked_pages:
+    changed_pages = set(pdf.changed_pages)
+    st.info(
+        f"Revision of an earlier upload: {len(changed_pages)} of {checked_pages} "
+        "checked pages changed"
+        + (f" ({format_page_ranges(pdf.changed_pages)})" if changed_pages else "")
+        + ". Unchanged pages reuse their earlier results."
+    )
+
 if misspelled_words:
+    # Words on every checked sheet (title block, general notes) come first.
+    repeated, others = split_repeated(misspelled_words, checked_pages)
+    misspelled_words = repeated + others
     st.markdown(
         f'<h2 class="sub-header">Results - {len(misspelled_words)} Misspelled Words Found</h2>',
         unsafe_allow_html=True,
     )
 
-    df_data = {
-        "Include": [False for _ in range(len(misspelled_words))],
-        "MisspelledWord": [x["original"] for x in misspelled_words],
-        "Instances": [len(x["pages"]) for x in misspelled_words],
-        "Pages": [
-            ", ".join(map(str, sorted(set(x["pages"])))) for x in misspelled_words
-        ],
-    }
-    df = pd.DataFrame(df_data)
+    # Found by the job, so building a suggestion index never blocks the page
+    found = result_cache.get(suggestions_key(cache_key)) or {}
+    suggestions = [", ".join(found.get(x.cleaned, [])) for x in misspelled_words]
+
+    with recorder().span("results_table", rows=len(misspelled_words)):
+        df_data = {
+            "Include": [False for _ in range(len(misspelled_words))],
+            "MisspelledWord": [x.original for x in misspelled_words],
+            "Suggestions": suggestions,
+            "Instances": [len(x) for x in misspelled_words],
+            "Pages": ["All"] * len(repeated) + [x.page_list() for x in others],
+        }
+        if repeated:
+            df_data["EverySheet"] = [True] * len(repeated) + [False] * len(others)
+        if changed_pages is not None:
+            df_data["New"] = [x.only_on_pages(changed_pages) for x in misspelled_words]
+        found_elsewhere = [
+            ", ".join(dictionary.found_elsewhere(x.cleaned)) for x in misspelled_words
+        ]
+        if any(found_elsewhere):
+            df_data["FoundIn"] = found_elsewhere
+        df = pd.DataFrame(df_data)
 
     st.markdown(
         """
@@ -104,31 +367,55 @@ if misspelled_words:
         unsafe_allow_html=True,
     )
 
-    user_df = st.data_editor(
-        df,
-        use_container_width=True,
-        hide_index=True,
-        column_config={
-            "Include": st.column_config.CheckboxColumn(
-                "Include?",
-                help="Include results in export",
-                default=False,
-                width="small",
-            ),
-            "MisspelledWord": st.column_config.TextColumn(
-                "Misspelled Word",
-                width="large",
-            ),
-            "Instances": st.column_config.NumberColumn(
-                "Instances",
-                width="small",
-            ),
-            "Pages": st.column_config.TextColumn(
-                "Pages",
-                width="medium",
-            ),
-        },
-    )
+    with recorder().span("data_editor"):
+        user_df = st.data_editor(
+            df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Include": st.column_config.CheckboxColumn(
+                    "Include?",
+                    help="Include results in export",
+                    default=False,
+                    width="small",
+                ),
+                "MisspelledWord": st.column_config.TextColumn(
+                    "Misspelled Word",
+                    width="large",
+                ),
+                "Suggestions": st.column_config.TextColumn(
+                    "Suggestions",
+                    help="Closest dictionary words (up to two edits away)",
+                    width="medium",
+                ),
+                "Instances": st.column_config.NumberColumn(
+                    "Instances",
+                    width="small",
+                ),
+                "Pages": st.column_config.TextColumn(
+                    "Pages",
+                    width="medium",
+                ),
+                "EverySheet": st.column_config.CheckboxColumn(
+                    "Every Sheet?",
+                    help="Found on every checked page, e.g. in the title block "
+                    "or general notes",
+                    disabled=True,
+                    width="small",
+                ),
+                "FoundIn": st.column_config.TextColumn(
+                    "Found In",
+                    help="Dictionaries that are not selected but contain this word",
+                    width="medium",
+                ),
+                "New": st.column_config.CheckboxColumn(
+                    "New?",
+                    help="Only found on pages that changed in this revision",
+                    disabled=True,
+                    width="small",
+                ),
+            },
+        )
 
     st.divider()
 
@@ -142,27 +429,12 @@ if misspelled_words:
         col1, col2 = st.columns(2)
         with col1:
             if st.button("📥 Export to CSV", help="Download results as a CSV file"):
-                csv_data = []
-                for entry in chosen_words:
-                    csv_data.append(
-                        {
-                            "Word": entry["original"],
-                            "Occurrences": len(entry["pages"]),
-                            "Pages": ", ".join(map(str, sorted(set(entry["pages"])))),
-                        }
-                    )
-
-                csv_file = tempfile.NamedTemporaryFile(delete=False)
-                with open(csv_file.name, "w", newline="") as f:
-                    writer = csv.DictWriter(
-                        f, fieldnames=["Word", "Occurrences", "Pages"]
-                    )
-                    writer.writeheader()
-                    writer.writerows(csv_data)
+                csv_data = io.StringIO()
+                write_csv(chosen_words, csv_data)
 
                 st.download_button(
                     label="Download CSV",
-                    data=open(csv_file.name, "rb").read(),
+                    data=csv_data.getvalue(),
                     file_name="misspelled_words.csv",
                     mime="text/csv",
                 )
@@ -172,12 +444,16 @@ if misspelled_words:
                 "📄 Generate Highlighted PDF",
                 help="Generate a PDF with highlighted misspelled words",
             ):
-                pdf_bytes = pdf.highlight(chosen_words)
+                highlighted = pdf.highlight_to_file(chosen_words, new_temp_path(".pdf"))
+                # Read only when the user clicks (see the ZIP export above)
                 st.download_button(
                     label="Download Highlighted PDF",
-                    data=pdf_bytes,
+                    data=highlighted.read_bytes,
                     file_name="highlighted.pdf",
                     mime="application/pdf",
                 )
 else:
     st.info("✅ No misspelled words found in the document")
+
+if diagnostics is not None:
+    show_diagnostics(diagnostics)
@@ -0,0 +1,62 @@
+"""Micro-benchmark: per-token `clean_word` vs batched `clean_words`
+
+    python -m benchmarks.bench_clean_word [--tokens 200000] [--repeat 5]
+
+The corpus mimics a drawing set: a small vocabulary of notes, abbreviations
+and labels repeated many times, plus a tail of unique part numbers.
+"""
+
+import argparse
+import random
+import timeit
+
+from utils.pdf import clean_word, clean_words
+
+VOCABULARY: list[str] = [
+    "CONC", "TYP.", "(NBCC)", "REINF.", "U.N.O.", "SEE", "DETAIL", "SECTION",
+    "GRIDLINE", "EL.", "DWG", "NOTES:", "General", "steel", "anchor-bolts",
+    "-", "&", "c/w", "MPa", "Ø", "(TYP)", "REV", "ISSUED", "FOR", "TENDER",
+]  # fmt: skip
+
+
+def make_corpus(tokens: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(tokens):
+        if rng.random() < 0.9:
+            corpus.append(rng.choice(VOCABULARY))
+        else:
+            corpus.append(f"{rng.choice('ABCDEFGH')}{rng.randint(1, 9999)}")
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.tokens)
+    assert clean_words(corpus) == [clean_word(word) for word in corpus]
+
+    per_token = min(
+        timeit.repeat(
+            lambda: [clean_word(word) for word in corpus], number=1, repeat=args.repeat
+        )
+    )
+    batched = min(
+        timeit.repeat(lambda: clean_words(corpus), number=1, repeat=args.repeat)
+    )
+
+    print(f"tokens:     {len(corpus):,} ({len(set(corpus)):,} distinct)")
+    print(
+        f"clean_word:  {per_token * 1e3:8.1f} ms  {len(corpus) / per_token:12,.0f} tokens/s"
+    )
+    print(
+        f"clean_words: {batched * 1e3:8.1f} ms  {len(corpus) / batched:12,.0f} tokens/s"
+    )
+    print(f"speedup:     {per_token / batched:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
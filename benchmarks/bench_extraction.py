@@ -0,0 +1,95 @@
+"""Micro-benchmark: word extraction with the default and the fast profile
+
+    python -m benchmarks.bench_extraction [--pages 100] [--repeat 3]
+
+"Before" extracts every page like `page.get_text("words")` (its default
+flags, no text pre-check); "after" uses `ExtractionProfile()`. Documents:
+text-heavy sheets from the suite's generator, scanned sheets (one raster
+image each) and vector-only sheets (thousands of line segments), the last
+two with a title on every fourth sheet.
+"""
+
+import argparse
+import random
+import timeit
+
+import fitz
+
+from benchmarks.suite import make_pdf
+from utils.pdf import ExtractionProfile, extract_page
+
+BEFORE = ExtractionProfile(flags=fitz.TEXTFLAGS_WORDS, skip_textless=False)
+AFTER = ExtractionProfile()
+
+
+def make_scanned_pdf(pages: int, seed: int = 0) -> bytes:
+    """36x24in sheets, each a full-page raster scan"""
+    rng = random.Random(seed)
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 1800, 1200), False)
+    pix.set_rect(pix.irect, (255, 255, 255))
+    for y in range(0, 1200, 6):
+        pix.set_rect(fitz.IRect(0, y, 1800, y + 1), (rng.randrange(256),) * 3)
+    scan = pix.tobytes("png")
+
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=36 * 72, height=24 * 72)
+        page.insert_image(page.rect, stream=scan)
+        if page_num % 4 == 0:
+            page.insert_text((2200, 1650), f"SHEET A{page_num} GENERAL ARRANGEMENT")
+    return doc.tobytes(deflate=True)
+
+
+def make_vector_pdf(pages: int, segments: int = 4000, seed: int = 0) -> bytes:
+    """36x24in sheets of random line work, like an exported CAD drawing"""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=36 * 72, height=24 * 72)
+        shape = page.new_shape()
+        for _ in range(segments):
+            x, y = rng.uniform(0, 2592), rng.uniform(0, 1728)
+            shape.draw_line(
+                (x, y), (x + rng.uniform(-60, 60), y + rng.uniform(-60, 60))
+            )
+        shape.finish(width=0.3)
+        shape.commit()
+        if page_num % 4 == 0:
+            page.insert_text((2200, 1650), f"SHEET S{page_num} FRAMING PLAN")
+    return doc.tobytes(deflate=True)
+
+
+def pages_per_second(data: bytes, profile: ExtractionProfile, repeat: int) -> float:
+    doc = fitz.open(stream=data, filetype="pdf")
+    seconds = min(
+        timeit.repeat(
+            lambda: [extract_page(page, profile) for page in doc],
+            number=1,
+            repeat=repeat,
+        )
+    )
+    return len(doc) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    documents = {
+        "text-heavy": make_pdf(args.pages, 600),
+        "scanned": make_scanned_pdf(args.pages),
+        "vector-only": make_vector_pdf(args.pages),
+    }
+
+    print(f"{args.pages} pages per document, pages/s (best of {args.repeat})")
+    print(f"{'document':>12} {'before':>10} {'after':>10} {'speedup':>8}")
+    for name, data in documents.items():
+        before = pages_per_second(data, BEFORE, args.repeat)
+        after = pages_per_second(data, AFTER, args.repeat)
+        print(f"{name:>12} {before:10,.0f} {after:10,.0f} {after / before:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
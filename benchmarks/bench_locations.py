@@ -0,0 +1,85 @@
+"""Memory benchmark: dict-per-occurrence locations vs columnar `Misspelling`
+
+    python -m benchmarks.bench_locations [--words 2000] [--occurrences 25]
+
+Builds the same set of flagged words both ways and reports traced memory,
+pickled size and pickle round-trip time for each.
+"""
+
+import argparse
+import pickle
+import random
+import time
+import tracemalloc
+
+import fitz
+
+from utils.pdf import Misspelling
+
+
+def build_dicts(words: int, occurrences: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    results = []
+    for idx in range(words):
+        entry = {
+            "original": f"W{idx}",
+            "cleaned": f"W{idx}",
+            "pages": [],
+            "locations": [],
+        }
+        for _ in range(occurrences):
+            page_num = rng.randint(1, 1500)
+            x, y = rng.uniform(0, 2000), rng.uniform(0, 1400)
+            entry["pages"].append(page_num)
+            entry["locations"].append(
+                {"page": page_num - 1, "bbox": fitz.Rect(x, y, x + 30, y + 8)}
+            )
+        results.append(entry)
+    return results
+
+
+def build_columnar(words: int, occurrences: int, seed: int = 0) -> list[Misspelling]:
+    rng = random.Random(seed)
+    results = []
+    for idx in range(words):
+        entry = Misspelling(f"W{idx}", f"W{idx}")
+        for _ in range(occurrences):
+            page_num = rng.randint(1, 1500)
+            x, y = rng.uniform(0, 2000), rng.uniform(0, 1400)
+            entry.pages.append(page_num)
+            entry.bboxes.extend((x, y, x + 30, y + 8))
+        results.append(entry)
+    return results
+
+
+def measure(build, words: int, occurrences: int) -> tuple[int, int, float]:
+    tracemalloc.start()
+    results = build(words, occurrences)
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    pickled = pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL)
+    pickle.loads(pickled)
+    return traced, len(pickled), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=2_000)
+    parser.add_argument("--occurrences", type=int, default=25)
+    args = parser.parse_args()
+
+    print(f"{args.words:,} words x {args.occurrences} occurrences")
+    baseline = None
+    for label, build in (("dicts", build_dicts), ("columnar", build_columnar)):
+        traced, pickled, seconds = measure(build, args.words, args.occurrences)
+        baseline = baseline or traced
+        print(
+            f"{label:>9}: {traced / 1e6:7.2f} MB in memory ({baseline / traced:4.1f}x smaller)"
+            f"  {pickled / 1e6:7.2f} MB pickled  {seconds * 1e3:7.1f} ms pickle round-trip"
+        )
+
+
+if __name__ == "__main__":
+    main()
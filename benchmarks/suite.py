@@ -0,0 +1,276 @@
+"""Benchmark suite: startup, dictionary loading, checking, cleaning, highlighting
+
+    python -m benchmarks.suite [--pages 200] [--words-per-page 600]
+                               [--save results.json] [--baseline base.json]
+
+Generates a synthetic drawing set with PyMuPDF (offline, seeded), then times
+each stage in a fresh process so its peak RSS is measured on its own. Results
+can be saved as JSON; with `--baseline`, any stage slower than the baseline by
+more than `--threshold` is flagged and the exit code is 1.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import platform
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import fitz
+
+from utils.dictionary import (
+    forget_open_indexes,
+    load_compiled_dictionaries,
+    load_dictionaries,
+)
+from utils.pdf import Pdf, clean_word
+
+DICT_DIR: Path = Path(__file__).parent.parent / "default_dict"
+
+# Share of tokens in the synthetic PDF that are not dictionary words
+MISSPELLED_RATIO: float = 0.05
+
+# Modules a script or worker imports to use the spell-check core, and the
+# time allowed for importing them in a fresh interpreter (seconds)
+CORE_MODULES: tuple[str, ...] = (
+    "utils.batch",
+    "utils.cache",
+    "utils.dictionary",
+    "utils.jobs",
+    "utils.pdf",
+    "utils.report",
+    "utils.suggest",
+)
+COLD_START_BUDGET: float = 0.25
+
+STAGES: tuple[str, ...] = (
+    "cold_start",
+    "load_dictionaries",
+    "load_compiled_dictionaries",
+    "process_pdf",
+    "clean_word",
+    "highlight",
+)
+
+
+def make_pdf(pages: int, words_per_page: int, seed: int = 0) -> bytes:
+    """Build a PDF of `pages` 36x24in sheets with `words_per_page` words each"""
+    rng = random.Random(seed)
+    vocabulary = sorted(load_dictionaries([DICT_DIR / "General.txt"]))
+    vocabulary += rng.sample(
+        sorted(load_dictionaries([DICT_DIR / "Eng_Dictionary.txt"])), 5_000
+    )
+
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=36 * 72, height=24 * 72)
+        words = [
+            "".join(rng.choices("QXZJKV", k=rng.randint(4, 9)))
+            if rng.random() < MISSPELLED_RATIO
+            else rng.choice(vocabulary)
+            for _ in range(words_per_page)
+        ]
+        lines = [" ".join(words[i : i + 16]) for i in range(0, len(words), 16)]
+        page.insert_text((36, 36), "\n".join(lines), fontsize=7)
+    data = doc.tobytes(deflate=True)
+    doc.close()
+    return data
+
+
+def cold_start_seconds() -> float:
+    """Time to import `CORE_MODULES` in a fresh interpreter
+
+    Measured inside the child, so interpreter startup itself is not counted.
+    """
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {', '.join(CORE_MODULES)}; "
+        "print(time.perf_counter() - start)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output)
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process in MB (None on Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+def run_stage(stage: str, pdf_bytes: bytes, repeat: int, workers: int) -> dict:
+    """Time one stage (best of `repeat`) in the current process"""
+    dict_files = sorted(DICT_DIR.glob("*.txt"))
+    # Indexes are built up front; the stage measures opening them.
+    dictionary = load_compiled_dictionaries(dict_files)
+    pages = tokens = 0
+    timings = []
+
+    for _ in range(repeat):
+        if stage == "cold_start":
+            timings.append(cold_start_seconds())
+
+        elif stage == "load_dictionaries":
+            start = time.perf_counter()
+            tokens = len(load_dictionaries(dict_files))
+            timings.append(time.perf_counter() - start)
+
+        elif stage == "load_compiled_dictionaries":
+            forget_open_indexes()
+            start = time.perf_counter()
+            tokens = len(load_compiled_dictionaries(dict_files))
+            timings.append(time.perf_counter() - start)
+
+        elif stage == "process_pdf":
+            pdf = Pdf(io.BytesIO(pdf_bytes))
+            start = time.perf_counter()
+            pdf.process_pdf(dictionary, workers=workers)
+            timings.append(time.perf_counter() - start)
+            pages = pdf.page_count
+            tokens = sum(len(page) for page in pdf.page_tokens)
+
+        elif stage == "clean_word":
+            pdf = Pdf(io.BytesIO(pdf_bytes))
+            words = [word for _, page in pdf.iter_page_tokens(1) for word in page.words]
+            start = time.perf_counter()
+            for word in words:
+                clean_word(word)
+            timings.append(time.perf_counter() - start)
+            tokens = len(words)
+
+        elif stage == "highlight":
+            pdf = Pdf(io.BytesIO(pdf_bytes))
+            misspellings = pdf.process_pdf(dictionary, workers=1)
+            start = time.perf_counter()
+            pdf.highlight(misspellings)
+            timings.append(time.perf_counter() - start)
+            pages = pdf.page_count
+            tokens = sum(len(entry) for entry in misspellings)
+
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+
+    seconds = min(timings)
+    return {
+        "seconds": seconds,
+        "pages_per_s": pages / seconds if pages else None,
+        "tokens_per_s": tokens / seconds if tokens else None,
+        "tokens": tokens,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Describe every stage more than `threshold` slower than `baseline`"""
+    regressions = []
+    for stage, result in results["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if before is None:
+            continue
+        slowdown = result["seconds"] / before["seconds"] - 1
+        if slowdown > threshold:
+            regressions.append(
+                f"{stage}: {before['seconds'] * 1e3:.1f} ms -> "
+                f"{result['seconds'] * 1e3:.1f} ms (+{slowdown:.0%})"
+            )
+    return regressions
+
+
+def _format_rate(value: float | None) -> str:
+    return f"{value:12,.0f}" if value is not None else f"{'-':>12}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--words-per-page", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="process_pdf workers (default: auto)"
+    )
+    parser.add_argument("--stage", action="append", choices=STAGES)
+    parser.add_argument("--save", type=Path, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="Flag stages slower than the baseline by more than this fraction",
+    )
+    args = parser.parse_args()
+
+    pdf_bytes = make_pdf(args.pages, args.words_per_page, args.seed)
+    results = {
+        "config": {
+            "pages": args.pages,
+            "words_per_page": args.words_per_page,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "workers": args.workers,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "platform": platform.platform(),
+        },
+        "stages": {},
+    }
+
+    # A fresh interpreter per stage keeps peak RSS and warm caches separate.
+    context = multiprocessing.get_context("spawn")
+    print(f"{args.pages} pages x {args.words_per_page} words ({len(pdf_bytes):,} B)")
+    print(f"{'stage':>27} {'ms':>9} {'pages/s':>12} {'tokens/s':>12} {'peak RSS':>9}")
+    for stage in args.stage or STAGES:
+        with context.Pool(1) as pool:
+            result = pool.apply(
+                run_stage, (stage, pdf_bytes, args.repeat, args.workers)
+            )
+        results["stages"][stage] = result
+        rss = result["peak_rss_mb"]
+        print(
+            f"{stage:>27} {result['seconds'] * 1e3:9.1f}"
+            f" {_format_rate(result['pages_per_s'])}"
+            f" {_format_rate(result['tokens_per_s'])}"
+            f" {f'{rss:.0f} MB' if rss is not None else '-':>9}"
+        )
+
+    cold_start = results["stages"].get("cold_start")
+    if cold_start and cold_start["seconds"] > COLD_START_BUDGET:
+        print(
+            f"Warning: importing the core took {cold_start['seconds'] * 1e3:.0f} ms, "
+            f"over the {COLD_START_BUDGET * 1e3:.0f} ms budget"
+        )
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Saved results to {args.save}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("config") != results["config"]:
+            print("Warning: baseline was recorded with a different configuration")
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No stage regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
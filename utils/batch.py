@@ -0,0 +1,260 @@
+import io
+import os
+import zipfile
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Literal
+
+from utils.cache import (
+    Cache,
+    ResultCache,
+    load_page_tokens,
+    results_key,
+    store_page_tokens,
+)
+from utils.dictionary import load_compiled_dictionaries
+from utils.pdf import DEFAULT_PROFILE, ExtractionProfile, Misspelling, Pdf
+from utils.report import (
+    combine_results,
+    write_combined_csv,
+    write_csv,
+    write_json,
+)
+from utils.storage import new_temp_path
+
+ReportFormat = Literal["csv", "json"]
+
+# What a bad file can raise: unreadable paths and dictionaries (OSError,
+# UnicodeDecodeError), damaged PDFs (fitz's FileDataError), a crashed worker
+# (BrokenProcessPool). Anything else is a bug and should surface.
+FILE_ERRORS = (OSError, RuntimeError, ValueError)
+
+
+@dataclass
+class BatchResult:
+    pdf_path: Path
+    misspelled: int = 0
+    occurrences: int = 0
+    report_path: Path | None = None
+    highlighted_path: Path | None = None
+    error: str | None = None
+
+
+def find_pdfs(paths: list[Path], recursive: bool = False) -> list[Path]:
+    """Expand files and directories into a sorted, de-duplicated list of PDFs"""
+    pdfs: set[Path] = set()
+    for path in paths:
+        if path.is_dir():
+            pattern = "**/*" if recursive else "*"
+            pdfs.update(
+                file
+                for file in path.glob(pattern)
+                if file.is_file() and file.suffix.lower() == ".pdf"
+            )
+        elif path.is_file():
+            pdfs.add(path)
+        else:
+            raise FileNotFoundError(path)
+    return sorted(pdfs)
+
+
+def check_pdf(
+    pdf_path: Path,
+    dict_files: list[Path],
+    cache: Cache | None = None,
+    digest: str | None = None,
+    profile: ExtractionProfile = DEFAULT_PROFILE,
+) -> tuple[Pdf, list[Misspelling]]:
+    """Spell-check one PDF in this process, through `cache` if given
+
+    Pass `digest` if the file's SHA-256 is already known (e.g. for a spooled
+    upload) to skip hashing it again. Words are extracted with `profile`.
+    """
+    pdf = Pdf(path=pdf_path, digest=digest, profile=profile)
+    key = results_key(pdf.digest, dict_files, extraction=profile.cache_key())
+    misspellings = cache.get(key) if cache is not None else None
+    if misspellings is None:
+        if cache is not None:
+            load_page_tokens(cache, pdf)
+        # One file per worker: never nest a page pool inside the file pool.
+        misspellings = pdf.process_pdf(
+            load_compiled_dictionaries(dict_files), workers=1
+        )
+        if cache is not None:
+            cache.put(key, misspellings)
+            if pdf.pages_extracted:
+                store_page_tokens(cache, pdf)
+    return pdf, misspellings
+
+
+def check_file(
+    pdf_path: Path,
+    dict_files: list[Path],
+    out_dir: Path,
+    report_format: ReportFormat = "csv",
+    highlight: bool = False,
+    use_cache: bool = True,
+    profile: ExtractionProfile = DEFAULT_PROFILE,
+    stem: str | None = None,
+) -> BatchResult:
+    """Spell-check one PDF and write its report (and highlighted copy)
+
+    Output files are named after `stem` (default: the PDF's own stem).
+    """
+    stem = stem or pdf_path.stem
+    result = BatchResult(pdf_path=pdf_path)
+    try:
+        pdf, misspellings = check_pdf(
+            pdf_path,
+            dict_files,
+            ResultCache() if use_cache else None,
+            profile=profile,
+        )
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        result.report_path = out_dir / f"{stem}.{report_format}"
+        with open(result.report_path, "w", newline="", encoding="utf-8") as f:
+            (write_csv if report_format == "csv" else write_json)(misspellings, f)
+
+        if highlight:
+            result.highlighted_path = pdf.highlight_to_file(
+                misspellings, out_dir / f"{stem}_highlighted.pdf"
+            )
+
+        result.misspelled = len(misspellings)
+        result.occurrences = sum(len(entry) for entry in misspellings)
+    except FILE_ERRORS as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+def run_batch(
+    pdf_paths: list[Path],
+    dict_files: list[Path],
+    out_dir: Path,
+    report_format: ReportFormat = "csv",
+    highlight: bool = False,
+    workers: int | None = None,
+    use_cache: bool = True,
+    profile: ExtractionProfile = DEFAULT_PROFILE,
+) -> Iterator[BatchResult]:
+    """Check `pdf_paths` on a process pool, yielding results as files finish
+
+    `workers` defaults to the CPU count; `workers=1` checks the files one
+    after another in this process. PDFs with the same name (e.g. from
+    different folders) get reports named like `write_zip` names them.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(pdf_paths))
+    args = (dict_files, out_dir, report_format, highlight, use_cache, profile)
+    stems = unique_stems([pdf_path.name for pdf_path in pdf_paths])
+    if workers <= 1:
+        for pdf_path, stem in zip(pdf_paths, stems):
+            yield check_file(pdf_path, *args, stem)
+        return
+
+    # Compile stale dictionaries here once, not in every worker at once.
+    load_compiled_dictionaries(dict_files)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(check_file, pdf_path, *args, stem)
+            for pdf_path, stem in zip(pdf_paths, stems)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def check_pdf_files(
+    documents: list[tuple[str, Path, str | None]],
+    dict_files: list[Path],
+    workers: int | None = None,
+    use_cache: bool = True,
+) -> Iterator[tuple[str, list[Misspelling] | None, str | None]]:
+    """Check `(name, path, digest)` documents on a process pool
+
+    Yields `(name, misspellings, error)` as each file finishes, so the total
+    time is close to that of the largest file rather than the sum. Failures
+    are reported per file instead of stopping the others.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(documents))
+    if workers <= 1:
+        for name, path, digest in documents:
+            try:
+                yield (
+                    name,
+                    _check_pdf_results(path, dict_files, use_cache, digest),
+                    None,
+                )
+            except FILE_ERRORS as e:
+                yield name, None, f"{type(e).__name__}: {e}"
+        return
+
+    load_compiled_dictionaries(dict_files)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                _check_pdf_results, path, dict_files, use_cache, digest
+            ): name
+            for name, path, digest in documents
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except FILE_ERRORS as e:
+                yield futures[future], None, f"{type(e).__name__}: {e}"
+
+
+def _check_pdf_results(
+    pdf_path: Path, dict_files: list[Path], use_cache: bool, digest: str | None
+) -> list[Misspelling]:
+    # Only the results cross the process boundary, not the `Pdf`.
+    cache = ResultCache() if use_cache else None
+    return check_pdf(pdf_path, dict_files, cache, digest)[1]
+
+
+def write_zip(
+    f: BinaryIO,
+    documents: list[tuple[str, Path, list[Misspelling]]],
+    highlight: bool = True,
+):
+    """Write one CSV (and highlighted PDF) per document plus a combined CSV
+
+    `documents` holds `(name, path, misspellings)`; each file is named after
+    the document, and files without misspellings get no highlighted copy.
+    """
+    stems = unique_stems([name for name, _, _ in documents])
+    with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as archive:
+        combined = io.StringIO()
+        write_combined_csv(
+            combine_results({name: words for name, _, words in documents}), combined
+        )
+        archive.writestr("all_files.csv", combined.getvalue())
+
+        for (name, path, misspellings), stem in zip(documents, stems):
+            report = io.StringIO()
+            write_csv(misspellings, report)
+            archive.writestr(f"{stem}.csv", report.getvalue())
+
+            if highlight and misspellings:
+                highlighted = Pdf(path=path).highlight_to_file(
+                    misspellings, new_temp_path(".pdf")
+                )
+                # Highlighted PDFs are already compressed
+                archive.write(
+                    highlighted, f"{stem}_highlighted.pdf", zipfile.ZIP_STORED
+                )
+                highlighted.unlink()
+
+
+def unique_stems(names: list[str]) -> list[str]:
+    """File stems of `names`, with `_` appended to repeats to keep them apart"""
+    seen: set[str] = set()
+    stems = []
+    for name in names:
+        stem = Path(name).stem
+        while stem in seen:
+            stem += "_"
+        seen.add(stem)
+        stems.append(stem)
+    return stems
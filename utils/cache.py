@@ -0,0 +1,255 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Protocol
+
+from utils.instrument import recorder
+from utils.storage import new_temp_file
+
+DEFAULT_CACHE_DIR: Path = Path(
+    os.environ.get("PDF_SPELLCHECK_CACHE", Path(__file__).parent.parent / ".cache")
+)
+DEFAULT_MAX_BYTES: int = 512 * 1024 * 1024
+
+# Bump whenever the pickled result types change so old entries are ignored
+CACHE_VERSION: int = 5
+
+
+def dictionary_fingerprint(dict_files: list[Path]) -> str:
+    """Fingerprint a dictionary selection from file paths, sizes and mtimes
+
+    Any edit to a selected file (e.g. a word added through `CreateDict.py`)
+    changes the fingerprint, so only cache entries built from that file miss.
+    """
+    digest = hashlib.sha256()
+    for file in sorted(dict_files):
+        stat = file.stat()
+        digest.update(f"{file.resolve()}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def results_key(
+    pdf_digest: str,
+    dict_files: list[Path],
+    pages: list[int] | None = None,
+    extraction: str | None = None,
+) -> str:
+    """Cache key for a document's spell-check results under `dict_files`
+
+    `pages` keys the results of a check limited to those pages, and
+    `extraction` (`ExtractionProfile.cache_key`) those of a non-default
+    extraction profile.
+    """
+    key = f"{pdf_digest}-{dictionary_fingerprint(dict_files)}"
+    if pages is not None:
+        selection = ",".join(map(str, pages)).encode()
+        key += f"-p{hashlib.sha256(selection).hexdigest()[:16]}"
+    return f"{key}{_extraction_suffix(extraction)}-v{CACHE_VERSION}"
+
+
+def suggestions_key(results_key: str) -> str:
+    """Cache key for the suggestions for the words stored under `results_key`"""
+    return f"{results_key}-suggestions"
+
+
+def words_key(pdf_digest: str, extraction: str | None = None) -> str:
+    """Cache key for the page fingerprints of a document's token tables"""
+    return f"{pdf_digest}-words{_extraction_suffix(extraction)}-v{CACHE_VERSION}"
+
+
+def page_key(fingerprint: str, extraction: str | None = None) -> str:
+    """Cache key for one page's token table, by its content fingerprint"""
+    return f"page-{fingerprint}{_extraction_suffix(extraction)}-v{CACHE_VERSION}"
+
+
+def _extraction_suffix(extraction: str | None) -> str:
+    return f"-x{extraction}" if extraction is not None else ""
+
+
+def load_page_tokens(cache: "Cache", pdf, pages: list[int] | None = None):
+    """Restore `pdf.page_tokens` from the cache, if anything is known
+
+    A document seen before is restored whole. Otherwise pages that match a
+    page of an earlier upload (e.g. the unchanged sheets of a new revision)
+    are restored one by one and `pdf.changed_pages` lists the rest; with
+    `pages`, only those pages are looked at.
+    """
+    if pdf.page_tokens is not None:
+        return
+    extraction = pdf.profile.cache_key()
+    fingerprints = cache.get(words_key(pdf.digest, extraction))
+    if fingerprints is not None:
+        # Pages evicted since are left None and extracted again.
+        pdf.page_tokens = [
+            cache.get(page_key(fingerprint, extraction))
+            if fingerprint is not None
+            else None
+            for fingerprint in fingerprints
+        ]
+    else:
+        pdf.reuse_page_tokens(
+            lambda fingerprint: cache.get(page_key(fingerprint, extraction)), pages
+        )
+
+
+def store_page_tokens(cache: "Cache", pdf):
+    """Store `pdf.page_tokens` by page fingerprint, and the document's list
+
+    Each page's tokens are stored once, under its fingerprint; the document
+    entry only lists the fingerprints. Only pages that have tokens are
+    fingerprinted.
+    """
+    extraction = pdf.profile.cache_key()
+    fingerprints: list[str | None] = []
+    for page_num, tokens in enumerate(pdf.page_tokens, start=1):
+        if tokens is None:
+            fingerprints.append(None)
+            continue
+        fingerprint = pdf.fingerprint(page_num)
+        key = page_key(fingerprint, extraction)
+        if key not in cache:
+            cache.put(key, tokens, evict=False)
+        fingerprints.append(fingerprint)
+    cache.put(words_key(pdf.digest, extraction), fingerprints, evict=False)
+    cache.evict()
+
+
+class Cache(Protocol):
+    """What the spell-check core needs from a result cache
+
+    The core takes the cache as an argument and never picks one itself:
+    `ResultCache` persists results on disk (apps, batch runs), `MemoryCache`
+    keeps them in the current process (scripts, tests).
+    """
+
+    def __contains__(self, key: str) -> bool: ...
+
+    def get(self, key: str) -> Any | None: ...
+
+    def put(self, key: str, value: Any, evict: bool = True): ...
+
+    def evict(self): ...
+
+
+class MemoryCache:
+    """In-process LRU cache with the `ResultCache` interface
+
+    Values are stored as is (not copied), so callers must not mutate them.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Any | None:
+        if key not in self._entries:
+            recorder().count("result_cache.misses")
+            return None
+        recorder().count("result_cache.hits")
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: str, value: Any, evict: bool = True):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if evict:
+            self.evict()
+
+    def evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class ResultCache:
+    """Size-bounded on-disk cache of pickled results with LRU eviction
+
+    Keys are plain strings (typically content hashes); each entry is stored as
+    one file whose mtime is bumped on every hit, so eviction removes the least
+    recently used entries first.
+    """
+
+    def __init__(
+        self, directory: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def get(self, key: str) -> Any | None:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            recorder().count("result_cache.misses")
+            return None
+
+        try:
+            value = pickle.loads(data)
+        except (
+            AttributeError,
+            EOFError,
+            ImportError,
+            IndexError,
+            TypeError,
+            ValueError,
+            pickle.UnpicklingError,
+        ):
+            # Truncated or written by an incompatible version; drop it.
+            path.unlink(missing_ok=True)
+            recorder().count("result_cache.misses")
+            return None
+        recorder().count("result_cache.hits")
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # Evicted by another session in the meantime
+        return value
+
+    def put(self, key: str, value: Any, evict: bool = True):
+        """Store `value` under `key`
+
+        With `evict=False` the size limit is not enforced; call `evict` after
+        the last of many puts instead.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so readers never see a partial entry.
+        with new_temp_file(self.directory) as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, self._path(key))
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits `max_bytes`"""
+        entries = []
+        for path in self.directory.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob("*.pkl"):
+            path.unlink(missing_ok=True)
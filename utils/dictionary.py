@@ -1,15 +1,50 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from collections import Counter
+from collections.abc import Callable, Iterator
+from functools import cached_property
 from pathlib import Path
+from typing import BinaryIO, Generic, TypeVar
 
-import streamlit as st
+from utils.instrument import recorder
+from utils.storage import new_temp_file
+
+# Compiled indexes live next to their source files, one file per source
+# revision: `<stem>-<size>-<mtime_ns>.idx`.
+COMPILED_DIR_NAME: str = ".compiled"
+
+# Layout of a compiled index (all integers native-endian uint32 after the
+# header):
+#   header   magic, word count, hash table size
+#   offsets  count + 1 offsets of each word into `blob`, in sorted order
+#   table    open-addressing hash table of word index + 1 (0 = empty slot)
+#   blob     the uppercased words, UTF-8 encoded and concatenated
+_MAGIC: bytes = b"PSCIDX1" + sys.byteorder[0].encode()
+_HEADER = struct.Struct("=8sII")
+
+# Every dictionary in a directory is also merged into one index, rebuilt
+# when any of them changes: `.compiled/merged/dictionaries-<count>-<hash>.idx`.
+# It adds, between the hash table and the words:
+#   masks    per word, bit `i` set if the `i`-th source dictionary has it
+#   names    the source file stems, newline-separated (UTF-8)
+MERGED_DIR_NAME: str = "merged"
+MAX_MERGED_DICTIONARIES: int = 32
+_MERGED_MAGIC: bytes = b"PSCMRG1" + sys.byteorder[0].encode()
+_MERGED_HEADER = struct.Struct("=8sIIII")
 
 
-@st.cache_data
 def load_dictionaries(dict_files: list[Path]) -> set[str]:
     """Load dictionary files into a set of lowercase words"""
     dictionary = set()
-    for file in dict_files:
-        _dict_vals = load_dictionary(filepath=file)
-        dictionary.update(_dict_vals)
+    with recorder().span("load_dictionaries", files=len(dict_files)):
+        for file in dict_files:
+            _dict_vals = load_dictionary(filepath=file)
+            dictionary.update(_dict_vals)
     return dictionary
 
 
@@ -17,3 +52,396 @@ def load_dictionary(filepath: Path) -> set[str]:
     contents: list[str] = filepath.read_text(encoding="utf-8").splitlines()
     dictionary: set[str] = set([x.strip().upper() for x in contents])
     return dictionary
+
+
+def add_words(filepath: Path, words: list[str]) -> list[str]:
+    """Append the `words` missing from a dictionary file and recompile it
+
+    Returns the (uppercased) words that were actually added.
+    """
+    existing = open_index(compile_dictionary(filepath))
+    added = sorted({word.strip().upper() for word in words} - {""})
+    added = [word for word in added if word not in existing]
+    if not added:
+        return []
+
+    contents = filepath.read_bytes()
+    with open(filepath, "a", encoding="utf-8") as f:
+        if contents and not contents.endswith(b"\n"):
+            f.write("\n")
+        f.write("\n".join(added) + "\n")
+    compile_dictionary(filepath)
+    return added
+
+
+def compile_dictionary(filepath: Path) -> Path:
+    """Compile a dictionary `.txt` into a memory-mappable index
+
+    Returns the path of the index for the file's current size and mtime,
+    building it first if needed. Indexes for older revisions of the file are
+    removed where possible.
+    """
+    stat = filepath.stat()
+    compiled_dir = filepath.parent / COMPILED_DIR_NAME
+    index_path = compiled_dir / f"{filepath.stem}-{stat.st_size}-{stat.st_mtime_ns}.idx"
+    if index_path.exists():
+        return index_path
+
+    with recorder().span("compile_dictionary", file=filepath.name):
+        _write_index(filepath, index_path)
+
+    # Also removes derived files of older revisions (e.g. suggestion indexes),
+    # but not those of other dictionaries sharing a prefix ("Civil-Extra").
+    for stale in compiled_dir.glob(f"{filepath.stem}-*"):
+        if _source_of(stale) == _source_of(index_path) and (
+            stale.stem != index_path.stem
+        ):
+            try:
+                stale.unlink()
+            except OSError:
+                pass  # Still mapped by another process (Windows)
+    return index_path
+
+
+def _write_index(filepath: Path, index_path: Path):
+    words = sorted(word.encode("utf-8") for word in load_dictionary(filepath) if word)
+    offsets, table = _hash_table(words)
+
+    def write(f: BinaryIO):
+        f.write(_HEADER.pack(_MAGIC, len(words), len(table)))
+        offsets.tofile(f)
+        table.tofile(f)
+        f.write(b"".join(words))
+
+    write_compiled(index_path, write)
+
+
+def write_compiled(path: Path, write: Callable[[BinaryIO], None]):
+    """Create the compiled file `path` with `write`, safely across processes
+
+    Each writer fills its own temporary file and then renames it into place,
+    so processes compiling the same revision at once never see each other's
+    partial output. If the rename fails but another process already
+    installed `path` (e.g. it is mapped on Windows), that file is used.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with new_temp_file(path.parent) as f:
+        write(f)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        if not path.exists():
+            raise
+
+
+def _hash_table(words: list[bytes]) -> tuple[array, array]:
+    """Word offsets and open-addressing hash table for sorted `words`"""
+    offsets = array("I", [0])
+    for word in words:
+        offsets.append(offsets[-1] + len(word))
+
+    table_size = 1 << max(3, (2 * len(words) - 1).bit_length())
+    table = array("I", bytes(4 * table_size))
+    mask = table_size - 1
+    for idx, word in enumerate(words):
+        slot = zlib.crc32(word) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = idx + 1
+    return offsets, table
+
+
+def compile_merged(directory: Path) -> Path:
+    """Merge every dictionary `.txt` in `directory` into one index
+
+    Returns the path of the merged index for the directory's current files,
+    building it (from their compiled indexes) first if needed. Any selection
+    of these dictionaries is then checked with one lookup and a bitmask.
+    """
+    sources = sorted(directory.glob("*.txt"))
+    if len(sources) > MAX_MERGED_DICTIONARIES:
+        raise ValueError(
+            f"Cannot merge more than {MAX_MERGED_DICTIONARIES} dictionaries "
+            f"({len(sources)} in {directory})"
+        )
+    index_paths = [compile_dictionary(source) for source in sources]
+    revision = zlib.crc32("\n".join(path.name for path in index_paths).encode())
+    merged_dir = directory / COMPILED_DIR_NAME / MERGED_DIR_NAME
+    merged_path = merged_dir / f"dictionaries-{len(sources)}-{revision:08x}.idx"
+    if merged_path.exists():
+        return merged_path
+
+    with recorder().span("compile_merged", files=len(sources)):
+        masks: dict[bytes, int] = {}
+        for bit, index_path in enumerate(index_paths):
+            index = open_index(index_path)
+            for idx in range(len(index)):
+                word = index._word_bytes(idx)
+                masks[word] = masks.get(word, 0) | 1 << bit
+        words = sorted(masks)
+        offsets, table = _hash_table(words)
+        names = "\n".join(source.stem for source in sources).encode("utf-8")
+
+        def write(f: BinaryIO):
+            f.write(
+                _MERGED_HEADER.pack(
+                    _MERGED_MAGIC, len(words), len(table), len(sources), len(names)
+                )
+            )
+            offsets.tofile(f)
+            table.tofile(f)
+            array("I", [masks[word] for word in words]).tofile(f)
+            f.write(names)
+            f.write(b"".join(words))
+
+        write_compiled(merged_path, write)
+
+    for stale in merged_dir.glob("*.idx"):
+        if stale != merged_path:
+            try:
+                stale.unlink()
+            except OSError:
+                pass  # Still mapped by another process (Windows)
+    return merged_path
+
+
+class DictionaryIndex:
+    """Read-only, memory-mapped view of a compiled dictionary
+
+    Lookups hash straight into the mapped file, so opening an index costs
+    nothing up front and every process mapping the same file shares one
+    physical copy through the OS page cache.
+    """
+
+    _magic: bytes = _MAGIC
+    _header: struct.Struct = _HEADER
+
+    def __init__(self, index_path: Path):
+        self.path = index_path
+        with open(index_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._count, table_size, *extra = self._header.unpack_from(self._mmap)
+        if magic != self._magic:
+            raise ValueError(f"{index_path} is not a {type(self).__name__} file")
+
+        view = memoryview(self._mmap)
+        start = self._header.size
+        self._offsets = view[start : start + 4 * (self._count + 1)].cast("I")
+        start += 4 * (self._count + 1)
+        self._table = view[start : start + 4 * table_size].cast("I")
+        self._blob_start = self._map_extra(view, start + 4 * table_size, *extra)
+        self._mask = table_size - 1
+
+    def _map_extra(self, view: memoryview, start: int) -> int:
+        """Map what is stored before the words; returns where they start"""
+        return start
+
+    def __reduce__(self):
+        # Re-map the file in the receiving process instead of copying it.
+        return open_index, (self.path,)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, word: str) -> bool:
+        return self._find(word.encode("utf-8")) >= 0
+
+    def _find(self, encoded: bytes) -> int:
+        """Sorted position of `encoded`, or -1"""
+        slot = zlib.crc32(encoded) & self._mask
+        while idx := self._table[slot]:
+            if self._word_bytes(idx - 1) == encoded:
+                return idx - 1
+            slot = (slot + 1) & self._mask
+        return -1
+
+    def __iter__(self) -> Iterator[str]:
+        for idx in range(self._count):
+            yield self._word_bytes(idx).decode("utf-8")
+
+    def _word_bytes(self, idx: int) -> bytes:
+        start = self._blob_start
+        return self._mmap[start + self._offsets[idx] : start + self._offsets[idx + 1]]
+
+
+class MergedIndex(DictionaryIndex):
+    """Memory-mapped merge of several dictionaries, see `compile_merged`
+
+    Each word carries a bitmask of the dictionaries that contain it; bit `i`
+    stands for `names[i]`.
+    """
+
+    _magic = _MERGED_MAGIC
+    _header = _MERGED_HEADER
+
+    def _map_extra(
+        self, view: memoryview, start: int, source_count: int, names_size: int
+    ) -> int:
+        self._masks = view[start : start + 4 * self._count].cast("I")
+        start += 4 * self._count
+        names = bytes(view[start : start + names_size]).decode("utf-8")
+        self.names: list[str] = names.split("\n") if source_count else []
+        return start + names_size
+
+    def __reduce__(self):
+        return open_merged, (self.path,)
+
+    def mask_of(self, word: str) -> int:
+        """Bitmask of the dictionaries containing `word` (0 if none)"""
+        idx = self._find(word.encode("utf-8"))
+        return self._masks[idx] if idx >= 0 else 0
+
+    def mask_for(self, names: list[str]) -> int:
+        """Selection mask for dictionaries by stem; unknown names are ignored"""
+        return sum(1 << bit for bit, name in enumerate(self.names) if name in names)
+
+    def names_in(self, mask: int) -> list[str]:
+        return [name for bit, name in enumerate(self.names) if mask >> bit & 1]
+
+    @cached_property
+    def mask_counts(self) -> Counter[int]:
+        """Number of words per distinct bitmask"""
+        return Counter(self._masks)
+
+
+T = TypeVar("T")
+
+
+class RevisionCache(Generic[T]):
+    """Objects opened from compiled files, shared by every session in a process
+
+    Compiled files are named `<stem>-<size>-<mtime_ns><suffix>` (see
+    `compile_dictionary`). Only the newest revision of each source file is
+    kept: opening a new one drops the older ones, so a server that has seen
+    many dictionary edits still maps each dictionary once.
+    """
+
+    def __init__(self, opener: Callable[[Path], T]):
+        self._opener = opener
+        self._opened: dict[Path, T] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> T:
+        if (opened := self._opened.get(path)) is not None:
+            return opened
+        with self._lock:
+            if path not in self._opened:
+                source = _source_of(path)
+                for other in [x for x in self._opened if _source_of(x) == source]:
+                    del self._opened[other]
+                self._opened[path] = self._opener(path)
+            return self._opened[path]
+
+    def clear(self):
+        with self._lock:
+            self._opened.clear()
+
+
+def _source_of(compiled_path: Path) -> tuple[Path, str]:
+    """Directory and source file stem of a compiled file"""
+    return compiled_path.parent, compiled_path.stem.rsplit("-", 2)[0]
+
+
+_indexes: RevisionCache[DictionaryIndex] = RevisionCache(DictionaryIndex)
+
+
+def open_index(index_path: Path) -> DictionaryIndex:
+    """Open the compiled index at `index_path`, once per process
+
+    The read-only index is shared by every session and rerun; opening a new
+    revision of the same dictionary releases the old one.
+    """
+    return _indexes.get(index_path)
+
+
+_merged_indexes: RevisionCache[MergedIndex] = RevisionCache(MergedIndex)
+
+
+def open_merged(merged_path: Path) -> MergedIndex:
+    """Open the merged index at `merged_path`, once per process"""
+    return _merged_indexes.get(merged_path)
+
+
+def forget_open_indexes():
+    """Drop every shared index, so the next `open_index` maps the file again"""
+    _indexes.clear()
+    _merged_indexes.clear()
+
+
+class DictionarySet:
+    """A selection of compiled dictionaries
+
+    With a merged index (dictionaries from one directory), a word is checked
+    with one lookup and an AND against the selection mask, and changing the
+    selection rebuilds nothing. Otherwise each index is checked in turn.
+    """
+
+    def __init__(
+        self,
+        indexes: list[DictionaryIndex],
+        merged: MergedIndex | None = None,
+        selection: int = 0,
+    ):
+        # Biggest first: most valid words are found in the general dictionary.
+        self.indexes: tuple[DictionaryIndex, ...] = tuple(
+            sorted(indexes, key=len, reverse=True)
+        )
+        self.merged = merged
+        self.selection = selection
+
+    def __len__(self) -> int:
+        """Distinct words in the selected dictionaries
+
+        Without a merged index, overlaps between dictionaries count twice.
+        """
+        if self.merged is not None:
+            return sum(
+                count
+                for mask, count in self.merged.mask_counts.items()
+                if mask & self.selection
+            )
+        return sum(len(index) for index in self.indexes)
+
+    def __contains__(self, word: str) -> bool:
+        if self.merged is not None:
+            return self.merged.mask_of(word) & self.selection != 0
+        return any(word in index for index in self.indexes)
+
+    def accepted_by(self, word: str) -> list[str]:
+        """Stems of the selected dictionaries that contain `word`"""
+        if self.merged is not None:
+            return self.merged.names_in(self.merged.mask_of(word) & self.selection)
+        return sorted(
+            _source_of(index.path)[1] for index in self.indexes if word in index
+        )
+
+    def found_elsewhere(self, word: str) -> list[str]:
+        """Stems of unselected dictionaries in the same directory with `word`
+
+        Always empty without a merged index.
+        """
+        if self.merged is None:
+            return []
+        return self.merged.names_in(self.merged.mask_of(word) & ~self.selection)
+
+
+def load_compiled_dictionaries(dict_files: list[Path]) -> DictionarySet:
+    """Open compiled indexes for `dict_files`, (re)building stale ones
+
+    Dictionaries from one directory are also checked through that
+    directory's merged index.
+    """
+    with recorder().span("load_compiled_dictionaries", files=len(dict_files)):
+        indexes = [open_index(compile_dictionary(file)) for file in dict_files]
+        directories = {file.parent for file in dict_files}
+        if len(directories) != 1 or any(file.suffix != ".txt" for file in dict_files):
+            return DictionarySet(indexes)
+        try:
+            merged = open_merged(compile_merged(directories.pop()))
+        except ValueError:
+            return DictionarySet(indexes)  # Too many dictionaries to merge
+        return DictionarySet(
+            indexes, merged, merged.mask_for([file.stem for file in dict_files])
+        )
@@ -0,0 +1,185 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import IO, Any, NamedTuple
+
+# Shared no-op context returned by the disabled recorder; reusable and free.
+_NULL_SPAN = nullcontext()
+
+
+class Span(NamedTuple):
+    """One timed stage; `start_ns` is on the `time.perf_counter_ns` clock"""
+
+    name: str
+    start_ns: int
+    duration_ns: int
+    pid: int
+    tid: int
+    args: dict[str, Any]
+
+
+class Recorder:
+    """Collects stage timings and counters for one run
+
+    Spans from process-pool workers are merged in with `extend`;
+    `perf_counter_ns` is a system-wide monotonic clock, so their timestamps
+    line up with the parent's in a trace.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self.counters: dict[str, int] = {}
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.spans.append(
+                Span(
+                    name,
+                    start,
+                    time.perf_counter_ns() - start,
+                    os.getpid(),
+                    threading.get_ident(),
+                    args,
+                )
+            )
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def extend(self, spans: list[Span]):
+        self.spans.extend(spans)
+
+    def merge(self, other: "Recorder", prefix: str = ""):
+        """Add the spans and counters of `other` (e.g. a background job's)
+
+        `prefix` is prepended to the names of the merged spans, to tell them
+        apart from this run's own stages.
+        """
+        self.spans.extend(
+            span._replace(name=f"{prefix}{span.name}") for span in other.spans
+        )
+        for name, value in other.counters.items():
+            self.count(name, value)
+
+    def stages(self) -> dict[str, dict[str, float]]:
+        """Total wall time and call count per span name, slowest first"""
+        stages: dict[str, dict[str, float]] = {}
+        for span in self.spans:
+            stage = stages.setdefault(span.name, {"calls": 0, "seconds": 0.0})
+            stage["calls"] += 1
+            stage["seconds"] += span.duration_ns / 1e9
+        return dict(sorted(stages.items(), key=lambda item: -item[1]["seconds"]))
+
+    def hit_ratios(self) -> dict[str, float]:
+        """Hit ratio for every `<name>.hits` / `<name>.misses` counter pair"""
+        ratios = {}
+        for key, hits in self.counters.items():
+            if not key.endswith(".hits"):
+                continue
+            name = key.removesuffix(".hits")
+            total = hits + self.counters.get(f"{name}.misses", 0)
+            ratios[name] = hits / total if total else 0.0
+        return ratios
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "stages": self.stages(),
+            "counters": self.counters,
+            "hit_ratios": self.hit_ratios(),
+            "spans": [
+                {
+                    "name": span.name,
+                    "start_ms": span.start_ns / 1e6,
+                    "duration_ms": span.duration_ns / 1e6,
+                    "pid": span.pid,
+                    **span.args,
+                }
+                for span in self.spans
+            ],
+        }
+
+    def write_json(self, f: IO[str]):
+        json.dump(self.to_dict(), f, indent=2)
+
+    def write_chrome_trace(self, f: IO[str]):
+        """Write the spans in Chrome's Trace Event format
+
+        Open the file in `chrome://tracing` or https://ui.perfetto.dev.
+        """
+        events = [
+            {
+                "name": span.name,
+                "cat": "pdf-spellcheck",
+                "ph": "X",
+                "ts": span.start_ns / 1e3,
+                "dur": span.duration_ns / 1e3,
+                "pid": span.pid,
+                "tid": span.tid,
+                "args": span.args,
+            }
+            for span in self.spans
+        ]
+        json.dump(
+            {
+                "traceEvents": events,
+                "displayTimeUnit": "ms",
+                "otherData": {"counters": self.counters},
+            },
+            f,
+        )
+
+
+class NullRecorder:
+    """Recorder used while instrumentation is off; every call is a no-op"""
+
+    enabled = False
+
+    def span(self, name: str, **args):
+        return _NULL_SPAN
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+    def extend(self, spans: list[Span]):
+        pass
+
+    def merge(self, other: Recorder, prefix: str = ""):
+        pass
+
+
+NULL_RECORDER = NullRecorder()
+
+# Per thread (i.e. per Streamlit session run) and per process.
+_current: contextvars.ContextVar[Recorder | NullRecorder] = contextvars.ContextVar(
+    "recorder", default=NULL_RECORDER
+)
+
+
+def recorder() -> Recorder | NullRecorder:
+    """The recorder for the current thread (a no-op one unless enabled)"""
+    return _current.get()
+
+
+def set_recorder(new_recorder: Recorder | None):
+    """Record into `new_recorder` in this thread from now on (None disables)"""
+    _current.set(new_recorder or NULL_RECORDER)
+
+
+@contextmanager
+def recording(new_recorder: Recorder | None = None):
+    """Record into `new_recorder` (a new one by default) inside the block"""
+    new_recorder = new_recorder or Recorder()
+    token = _current.set(new_recorder)
+    try:
+        yield new_recorder
+    finally:
+        _current.reset(token)
@@ -0,0 +1,283 @@
+import threading
+import time
+from collections.abc import Callable, Container
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Literal
+
+from utils.batch import check_pdf_files
+from utils.cache import Cache, load_page_tokens, store_page_tokens
+from utils.dictionary import DictionarySet, load_compiled_dictionaries
+from utils.instrument import Recorder, recorder, recording
+from utils.pdf import Misspelled, Misspelling, Pdf, merge_results
+from utils.suggest import open_suggestions, suggest
+
+# Documents checked at the same time; each large one also runs its own
+# page pool, so a few jobs are enough to keep the machine busy.
+MAX_CONCURRENT_JOBS: int = 2
+
+# Finished jobs are forgotten after this long (seconds); their results stay
+# in the result cache.
+JOB_MAX_AGE: float = 60 * 60
+
+# Finished jobs kept at most; the ones that finished first are forgotten first
+MAX_FINISHED_JOBS: int = 64
+
+# Publish partial results for live tables every this many pages
+PARTIAL_RESULTS_PAGES: int = 10
+
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+
+@dataclass(eq=False)
+class Job:
+    """A unit of background work and its progress, shared by every session
+
+    Fields are written by the worker thread and only read elsewhere;
+    `partial` (results so far) is replaced, never mutated, so readers always
+    see a consistent snapshot, and dropped when the job finishes. Jobs that
+    produce large results store them in a cache rather than in `result`.
+    """
+
+    key: str
+    status: JobStatus = "queued"
+    done: int = 0
+    total: int | None = None
+    message: str = ""
+    partial: Any = None
+    result: Any = None
+    error: str | None = None
+    recorder: Recorder = field(default_factory=Recorder, repr=False)
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    _finished: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    @property
+    def fraction(self) -> float:
+        return self.done / self.total if self.total else 0.0
+
+    def progress(self, done: int, total: int, message: str = ""):
+        self.done, self.total, self.message = done, total, message
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until the job finishes; False if `timeout` ran out first"""
+        return self._finished.wait(timeout)
+
+
+class JobQueue:
+    """Runs jobs on a thread pool and keeps their state outside any session
+
+    Jobs are keyed (e.g. by `results_key`), so sessions asking for the same
+    work attach to one job instead of starting another, and a session that
+    reruns finds its job where it left it.
+    """
+
+    def __init__(self, max_workers: int = MAX_CONCURRENT_JOBS):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="spellcheck-job"
+        )
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Job | None:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(key)
+
+    def forget(self, key: str):
+        """Drop the finished job `key`, so submitting it runs the work again"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.finished:
+                del self._jobs[key]
+
+    def submit(self, key: str, fn: Callable[..., Any], *args) -> Job:
+        """Run `fn(job, *args)` in the background, unless `key` is known
+
+        Returns the existing job for `key` if it is queued, running or done;
+        a failed job is replaced so the work can be retried. Every job records
+        its stage timings, so they can be shown even if diagnostics are
+        turned on after it was submitted.
+        """
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(key)
+            if job is not None and job.status != "failed":
+                return job
+            job = Job(key)
+            self._jobs[key] = job
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple):
+        job.status = "running"
+        try:
+            with recording(job.recorder):
+                job.result = fn(job, *args)
+            job.status = "done"
+        except Exception as e:  # noqa: BLE001 - shown on the page, not raised
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "failed"
+        finally:
+            job.partial = None
+            job.finished_at = time.time()
+            job._finished.set()
+
+    def _prune(
+        self, max_age: float = JOB_MAX_AGE, max_finished: int = MAX_FINISHED_JOBS
+    ):
+        cutoff = time.time() - max_age
+        finished = sorted(
+            (job.finished_at, key)
+            for key, job in self._jobs.items()
+            if job.finished_at is not None
+        )
+        for position, (finished_at, key) in enumerate(finished):
+            if finished_at < cutoff or position < len(finished) - max_finished:
+                del self._jobs[key]
+
+
+_queue_lock = threading.Lock()
+_queue: JobQueue | None = None
+
+
+def job_queue() -> JobQueue:
+    """The job queue shared by every session in this process"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def check_document(
+    job: Job,
+    pdf_path: Path,
+    digest: str,
+    dictionary: Container[str],
+    pages: list[int] | None,
+    cache: Cache,
+    cache_key: str,
+    suggestions_key: str | None = None,
+) -> list[int] | None:
+    """Spell-check a spooled upload as a job
+
+    The job opens its own `Pdf`, so it never shares a document handle with a
+    session, restores known pages from `cache` and stores the misspelled
+    words there under `cache_key`. With `suggestions_key`, it also stores
+    suggestions for them (`dictionary` must then be a `DictionarySet`),
+    reusing results already in `cache`. Returns the document's
+    `changed_pages`; the words are read back from `cache`, so finished jobs
+    do not hold them in memory.
+    """
+    misspelled_words = cache.get(cache_key) if suggestions_key is not None else None
+    changed_pages = None
+    if misspelled_words is None:
+        changed_pages, misspelled_words = _check_document(
+            job, pdf_path, digest, dictionary, pages, cache, cache_key
+        )
+    if suggestions_key is not None:
+        cache.put(
+            suggestions_key,
+            find_suggestions(job, dictionary, [x.cleaned for x in misspelled_words]),
+        )
+    return changed_pages
+
+
+def _check_document(
+    job: Job,
+    pdf_path: Path,
+    digest: str,
+    dictionary: Container[str],
+    pages: list[int] | None,
+    cache: Cache,
+    cache_key: str,
+) -> tuple[list[int] | None, list[Misspelling]]:
+    pdf = Pdf(path=pdf_path, digest=digest)
+    load_page_tokens(cache, pdf, pages)
+    extracted = pdf.pages_extracted
+    total = len(pages) if pages is not None else pdf.page_count
+
+    misspelled: Misspelled = {}
+    for done, (page_num, page_misspelled) in enumerate(
+        pdf.iter_misspellings(dictionary=dictionary, pages=pages), start=1
+    ):
+        merge_results(misspelled, page_misspelled)
+        job.progress(done, total, f"Checked page {page_num} ({done} of {total})")
+        if done % PARTIAL_RESULTS_PAGES == 0:
+            job.partial = list(misspelled.values())
+
+    misspelled_words = list(misspelled.values())
+    cache.put(cache_key, misspelled_words)
+    if pdf.pages_extracted > extracted:
+        store_page_tokens(cache, pdf)
+    return pdf.changed_pages, misspelled_words
+
+
+def check_documents(
+    job: Job,
+    documents: list[tuple[str, Path, str]],
+    dict_files: list[Path],
+    workers: int | None = None,
+    cache: Cache | None = None,
+    suggestions_key: str | None = None,
+) -> dict[str, str]:
+    """Spell-check several spooled uploads as one job, one file per process
+
+    `documents` holds `(name, path, digest)`. Results per file are published
+    in `partial` as files finish and stored in the result cache under
+    `results_key(digest, dict_files)` (see `check_pdf_files`). With `cache`
+    and `suggestions_key`, suggestions for every misspelled word are stored
+    in `cache` as well. Returns the error for each file that failed.
+    """
+    results: dict[str, list[Misspelling]] = {}
+    errors: dict[str, str] = {}
+    total = len(documents)
+    for done, (name, misspellings, error) in enumerate(
+        check_pdf_files(documents, dict_files, workers), start=1
+    ):
+        if error is not None:
+            errors[name] = error
+        else:
+            results[name] = misspellings
+        job.progress(done, total, f"Checked {name} ({done} of {total})")
+        job.partial = dict(results)
+
+    if cache is not None and suggestions_key is not None:
+        words = [x.cleaned for misspellings in results.values() for x in misspellings]
+        cache.put(
+            suggestions_key,
+            find_suggestions(job, load_compiled_dictionaries(dict_files), words),
+        )
+    return errors
+
+
+def find_suggestions(
+    job: Job, dictionary: DictionarySet, words: list[str]
+) -> dict[str, list[str]]:
+    """`suggest` for each distinct cleaned word, reporting progress on `job`"""
+    distinct = list(dict.fromkeys(words))
+    suggestions: dict[str, list[str]] = {}
+    with recorder().span("suggestions", words=len(distinct)):
+        for done, word in enumerate(distinct, start=1):
+            suggestions[word] = suggest(dictionary, word)
+            job.progress(
+                done, len(distinct), f"Finding suggestions ({done} of {len(distinct)})"
+            )
+    return suggestions
+
+
+def build_suggestions(job: Job, index_path: Path) -> Path:
+    """Build and open the suggestion index of a compiled dictionary as a job
+
+    Submitted after `add_words`, so the next check finds the index of the
+    updated dictionary ready instead of rebuilding it while the user waits.
+    A check that needs it before the job finishes waits for the same build.
+    """
+    open_suggestions(index_path)
+    return index_path
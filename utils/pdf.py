@@ -1,86 +1,838 @@
+import hashlib
+import os
 import re
+import shutil
+import sys
+from array import array
+from collections.abc import Callable, Container, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from functools import cached_property
-from typing import Any, Literal
+from pathlib import Path
+from typing import Literal
 
-import fitz
+from utils.instrument import Recorder, Span, recorder, set_recorder
+from utils.lazy import lazy_import
+
+# PyMuPDF is only loaded once a document is opened or a rectangle is built,
+# so tokenizing, checking and reporting start without it.
+fitz = lazy_import("fitz")
+
+# Documents shorter than this are processed serially; spinning up a process
+# pool costs more than it saves on a handful of pages.
+PARALLEL_MIN_PAGES: int = 50
+
+# Number of shards handed to each worker, so a few dense sheets don't leave
+# the rest of the pool idle at the end of a run.
+SHARDS_PER_WORKER: int = 4
+
+# Highlight colour: hex #57b431 as RGB (87, 180, 49)
+HIGHLIGHT_COLOR: tuple[float, float, float] = (87 / 255, 180 / 255, 49 / 255)
+
+# Upper bound on distinct tokens memoized by `TokenVerdicts` in one run
+TOKEN_CACHE_SIZE: int = 200_000
+
+# Upper bound on distinct text blocks memoized by `TokenVerdicts` in one run
+BLOCK_CACHE_SIZE: int = 50_000
+
+# TextPage flags for word extraction: only clip text to the page box
+# (fitz.TEXT_MEDIABOX_CLIP). Ligatures are expanded, so "ﬁ" cleans to "FI",
+# and whitespace, images and unknown-glyph codes are not kept; word boxes
+# need none of them.
+WORD_TEXT_FLAGS: int = 64
+
+# Sentinel for tokens `TokenVerdicts` has not seen yet (None means "valid")
+_UNSEEN = object()
+
+
+class Misspelling:
+    """A misspelled word and all of its occurrences, stored column-wise
+
+    `pages` holds the 1-based page number of each occurrence and `bboxes` the
+    matching `x0, y0, x1, y1` rectangles packed as float32, instead of one
+    dict and `fitz.Rect` per occurrence. Item access (`entry["pages"]`,
+    `entry["locations"]`) returns the older list-of-dicts view.
+    """
+
+    __slots__ = ("bboxes", "cleaned", "original", "pages")
+
+    def __init__(self, original: str, cleaned: str):
+        self.original = original
+        self.cleaned = cleaned
+        self.pages: array = array("I")
+        self.bboxes: array = array("f")
+
+    def __getstate__(self):
+        return self.original, self.cleaned, self.pages, self.bboxes
+
+    def __setstate__(self, state):
+        self.original, self.cleaned, self.pages, self.bboxes = state
+
+    def __getitem__(self, name: Literal["original", "cleaned", "pages", "locations"]):
+        if name == "pages":
+            return self.pages.tolist()
+        if name == "locations":
+            return [{"page": page_idx, "bbox": rect} for page_idx, rect in self.rects()]
+        return getattr(self, name)
+
+    def __len__(self) -> int:
+        """Number of occurrences"""
+        return len(self.pages)
+
+    def extend(self, other: "Misspelling"):
+        self.pages.extend(other.pages)
+        self.bboxes.extend(other.bboxes)
+
+    def page_list(self) -> str:
+        """Distinct page numbers as shown in the results table and CSV"""
+        return ", ".join(map(str, sorted(set(self.pages))))
+
+    def only_on_pages(self, pages: Container[int]) -> bool:
+        """Whether every occurrence is on one of the 1-based `pages`"""
+        return all(page_num in pages for page_num in self.pages)
+
+    def on_every_page(self, page_count: int) -> bool:
+        """Whether the word was found on each of `page_count` checked pages"""
+        return len(set(self.pages)) >= page_count
+
+    def rects(self) -> Iterator[tuple[int, "fitz.Rect"]]:
+        """Yield `(page_idx, rect)` per occurrence, with 0-based page indices"""
+        bboxes = self.bboxes
+        for idx, page_num in enumerate(self.pages):
+            yield page_num - 1, fitz.Rect(*bboxes[idx * 4 : idx * 4 + 4])
+
+
+Misspelled = dict[tuple[str, str], Misspelling]
+
+
+@dataclass(frozen=True)
+class ExtractionProfile:
+    """How words are read from each page
+
+    `flags` are the PyMuPDF `TEXT_*` flags the page's TextPage is built with.
+    `clip` limits extraction to the rectangle `(x0, y0, x1, y1)`, in the
+    same coordinates as the word boxes, e.g. to leave out the sheet border.
+    With `skip_textless`, pages whose content never draws text (scanned or
+    vector-only sheets) are skipped without building a TextPage.
+    """
+
+    flags: int = WORD_TEXT_FLAGS
+    clip: tuple[float, float, float, float] | None = None
+    skip_textless: bool = True
+
+    def cache_key(self) -> str | None:
+        """Short id for keying cached words and results; None by default"""
+        if self == DEFAULT_PROFILE:
+            return None
+        return hashlib.sha256(repr(self).encode()).hexdigest()[:16]
+
+
+DEFAULT_PROFILE = ExtractionProfile()
 
 
 class Pdf:
-    def __init__(self, pdf_file):
+    """A PDF given as a file-like object or, without buffering it, a path
+
+    Pass `digest` when the SHA-256 of the file is already known (e.g. from
+    `utils.storage.spool_upload`) to skip hashing it again. Words are
+    extracted with `profile`.
+    """
+
+    def __init__(
+        self,
+        pdf_file=None,
+        path: Path | None = None,
+        digest: str | None = None,
+        profile: ExtractionProfile = DEFAULT_PROFILE,
+    ):
         self.pdf_file = pdf_file
+        self.path = path
+        self.profile = profile
+        if digest is not None:
+            self.digest = digest
+        # Per-page token tables (None for pages not extracted yet), filled as
+        # pages are extracted or restored from a cache by the caller.
+        self.page_tokens: list[PageTokens | None] | None = None
+        # Pages extracted by this object, as opposed to restored from a cache
+        self.pages_extracted = 0
+        # Pages not found in an earlier upload, set by `reuse_page_tokens`
+        self.changed_pages: list[int] | None = None
+        # `page_fingerprint` by 1-based page number, computed on demand
+        self._fingerprints: dict[int, str] = {}
+
+    @cached_property
+    def data(self) -> bytes:
+        if self.path is not None:
+            return self.path.read_bytes()
+        return self.pdf_file.read()
+
+    @cached_property
+    def digest(self) -> str:
+        """SHA-256 of the PDF bytes, used to key cached results"""
+        if self.path is not None:
+            with open(self.path, "rb") as f:
+                return hashlib.file_digest(f, "sha256").hexdigest()
+        return hashlib.sha256(self.data).hexdigest()
 
     @cached_property
     def __doc(self):
-        return fitz.open(stream=self.pdf_file.read(), filetype="pdf")
+        with recorder().span("open_document"):
+            return self._open()
+
+    def _open(self):
+        """Open a new, independent document on the original file or bytes"""
+        if self.path is not None:
+            return fitz.open(self.path)
+        return fitz.open(stream=self.data, filetype="pdf")
 
     def highlight(
         self,
-        words_to_highlight: list[
-            dict[Literal["original", "cleaned", "pages", "locations"], Any]
-        ],
-    ):
-        """Generate PDF with highlighted words"""
-        doc = self.__doc
+        words_to_highlight: list[Misspelling],
+        compress: bool = True,
+    ) -> bytes:
+        """Generate PDF with highlighted words
 
-        for entry in words_to_highlight:
-            for location in entry["locations"]:
-                page = doc[location["page"]]
-                annot = page.add_rect_annot(location["bbox"])
-                # Convert hex #57b431 to RGB (87, 180, 49)
-                annot.set_colors(
-                    fill=(87 / 255, 180 / 255, 49 / 255)
-                )  # Using the green color
-                annot.update(opacity=0.3)  # Semi-transparent
+        Annotates a fresh copy of the original document, so repeated calls
+        never stack highlights. Occurrences are grouped by page and word:
+        each word gets one highlight annotation per page covering all of its
+        (merged) rectangles. `compress` packs objects into compressed object
+        streams, which keeps files with thousands of annotations small.
+        """
+        with recorder().span("highlight"), self._open() as doc:
+            add_highlights(doc, words_to_highlight)
 
-        return doc.tobytes()
+            if compress:
+                return doc.tobytes(deflate=True, use_objstms=1)
+            return doc.tobytes()
 
-    def process_pdf(
-        self, dictionary: set[str]
-    ) -> list[
-        dict[
-            tuple[str, str],
-            dict[Literal["original", "cleaned", "pages", "locations"], Any],
+    def highlight_to_file(
+        self,
+        words_to_highlight: list[Misspelling],
+        path: Path,
+        incremental: bool = True,
+    ) -> Path:
+        """Write the highlighted PDF to `path` instead of returning its bytes
+
+        With `incremental`, the original is copied to `path` and only the new
+        annotations are appended to it, so the work and memory scale with the
+        number of highlights rather than the size of the document. Documents
+        that cannot be updated incrementally (e.g. ones MuPDF had to repair)
+        are rewritten in full with compression.
+        """
+        path = Path(path)
+        with recorder().span("highlight", incremental=incremental):
+            if incremental:
+                if self.path is not None:
+                    shutil.copyfile(self.path, path)
+                else:
+                    path.write_bytes(self.data)
+                with fitz.open(path) as doc:
+                    if doc.can_save_incrementally():
+                        add_highlights(doc, words_to_highlight)
+                        doc.saveIncr()
+                        return path
+
+            with self._open() as doc:
+                add_highlights(doc, words_to_highlight)
+                doc.save(path, deflate=True, use_objstms=1)
+            return path
+
+    @property
+    def page_count(self) -> int:
+        return len(self.__doc)
+
+    def fingerprint(self, page_num: int) -> str:
+        """`page_fingerprint` of the 1-based `page_num`, computed once"""
+        fingerprint = self._fingerprints.get(page_num)
+        if fingerprint is None:
+            doc = self.__doc
+            fingerprint = page_fingerprint(doc, doc[page_num - 1])
+            self._fingerprints[page_num] = fingerprint
+        return fingerprint
+
+    @property
+    def fingerprints(self) -> list[str]:
+        """`page_fingerprint` of every page, in page order"""
+        with recorder().span("fingerprint_pages"):
+            return [self.fingerprint(page_num) for page_num in self.page_numbers()]
+
+    def page_numbers(self, pages: list[int] | None = None) -> list[int]:
+        """`pages`, or every 1-based page number if None"""
+        return list(range(1, self.page_count + 1)) if pages is None else pages
+
+    def reuse_page_tokens(
+        self,
+        lookup: Callable[[str], "PageTokens | None"],
+        pages: list[int] | None = None,
+    ) -> list[int]:
+        """Fill `page_tokens` with pages already extracted from other uploads
+
+        `lookup` maps a page fingerprint to the tokens stored for it (or
+        None). Only `pages` (default: all) are fingerprinted and looked up.
+        Returns the 1-based numbers of those it did not know, which are also
+        kept in `changed_pages`; only those pages are extracted by the next
+        pass.
+        """
+        pages = self.page_numbers(pages)
+        if self.page_tokens is None:
+            self.page_tokens = [None] * self.page_count
+        with recorder().span("fingerprint_pages", pages=len(pages)):
+            for page_num in pages:
+                self.page_tokens[page_num - 1] = lookup(self.fingerprint(page_num))
+        self.changed_pages = [
+            page_num for page_num in pages if self.page_tokens[page_num - 1] is None
         ]
-    ]:
-        """Process PDF and return misspelled words with locations"""
+        return self.changed_pages
+
+    def iter_page_tokens(
+        self, workers: int | None = None, pages: list[int] | None = None
+    ) -> Iterator[tuple[int, "PageTokens"]]:
+        """Yield `(page_num, tokens)` for each page, in page order
+
+        `pages` restricts the pass to those 1-based page numbers (e.g. from
+        `parse_page_ranges`); other pages are never loaded. Extracted pages
+        are memoized in `page_tokens`, so later passes (e.g. with a different
+        dictionary) only extract pages not seen before. `workers` sets the
+        size of the process pool (defaults to the CPU count). Passes under
+        `PARALLEL_MIN_PAGES` pages, or `workers=1`, run serially in this
+        process.
+        """
+        if self.page_tokens is None and pages is None:
+            extracted: list[PageTokens | None] = []
+            for page_num, tokens in self._extract(workers):
+                extracted.append(tokens)
+                yield page_num, tokens
+            self.page_tokens = extracted
+            return
+
+        if self.page_tokens is None:
+            self.page_tokens = [None] * self.page_count
+        known = self.page_tokens
+        if pages is None:
+            pages = list(range(1, len(known) + 1))
+        missing = self._extract(
+            workers, [page_num for page_num in pages if known[page_num - 1] is None]
+        )
+        for page_num in pages:
+            if known[page_num - 1] is None:
+                _, known[page_num - 1] = next(missing)
+            yield page_num, known[page_num - 1]
+
+    def _extract(
+        self, workers: int | None, pages: list[int] | None = None
+    ) -> Iterator[tuple[int, "PageTokens"]]:
+        """Extract `pages` (default: all), yielding them in the given order"""
         doc = self.__doc
-        misspelled: dict[
-            tuple[str, str],
-            dict[Literal["original", "cleaned", "pages", "locations"], Any],
-        ] = {}
-
-        for page_num, page in enumerate(doc, start=1):
-            words = page.get_text("words")
-            for word_info in words:
-                original_word = word_info[4]
-                cleaned_word = clean_word(original_word)
-
-                if not cleaned_word:
-                    continue
-
-                if cleaned_word not in dictionary:
-                    key = (original_word.upper(), cleaned_word)
-                    entry = {
-                        "original": original_word,
-                        "cleaned": cleaned_word,
-                        "pages": [],
-                        "locations": [],
-                    }
-
-                    if key not in misspelled:
-                        misspelled[key] = entry
-
-                    misspelled[key]["pages"].append(page_num)
-                    misspelled[key]["locations"].append(
-                        {
-                            "page": page_num - 1,  # 0-based index for PyMuPDF
-                            "bbox": fitz.Rect(word_info[:4]),
-                        }
-                    )
+        page_count = len(doc) if pages is None else len(pages)
+        workers = min(workers or os.cpu_count() or 1, page_count)
+
+        if workers <= 1 or page_count < PARALLEL_MIN_PAGES:
+            if pages is None:
+                numbered = enumerate(doc, start=1)
+            else:
+                numbered = ((page_num, doc[page_num - 1]) for page_num in pages)
+            for page_num, page in numbered:
+                self.pages_extracted += 1
+                yield page_num, extract_page(page, self.profile)
+            return
+
+        shards = _shard_pages(page_count, workers * SHARDS_PER_WORKER)
+        if pages is not None:
+            shards = [
+                [page_num - 1 for page_num in pages[shard.start : shard.stop]]
+                for shard in shards
+            ]
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.path or self.data, self.profile, recorder().enabled),
+        ) as executor:
+            # `map` yields in submission order, so pages come back in page
+            # order even though shards finish out of order.
+            for shard, spans in executor.map(_extract_shard, shards):
+                recorder().extend(spans)
+                self.pages_extracted += len(shard)
+                yield from shard
+
+    def iter_misspellings(
+        self,
+        dictionary: Container[str],
+        workers: int | None = None,
+        verdicts: "TokenVerdicts | None" = None,
+        pages: list[int] | None = None,
+    ) -> Iterator[tuple[int, Misspelled]]:
+        """Yield `(page_num, misspelled)` for each page, in page order
 
+        Each `misspelled` mapping only holds the current page's occurrences;
+        combine them with `merge_results`. Pass `verdicts` to read its hit
+        counters after the run, and `pages` to check only those pages.
+        """
+        if verdicts is None:
+            verdicts = TokenVerdicts(dictionary)
+        rec = recorder()
+        misses = verdicts.misses
+        block_lookups, block_misses = verdicts.block_lookups, verdicts.block_misses
+        checked = 0
+        for page_num, tokens in self.iter_page_tokens(workers, pages):
+            misspelled: Misspelled = {}
+            with rec.span("check_page", page=page_num):
+                check_tokens(tokens, page_num, verdicts, misspelled)
+            checked += len(tokens)
+            yield page_num, misspelled
+        # Every checked token is either looked up in the dictionary (a miss)
+        # or reuses a verdict, from the token memo or a repeated block.
+        rec.count("tokens", checked)
+        rec.count("token_memo.hits", checked - (verdicts.misses - misses))
+        rec.count("token_memo.misses", verdicts.misses - misses)
+        rec.count(
+            "block_memo.hits",
+            verdicts.block_lookups
+            - block_lookups
+            - (verdicts.block_misses - block_misses),
+        )
+        rec.count("block_memo.misses", verdicts.block_misses - block_misses)
+
+    def process_pdf(
+        self,
+        dictionary: Container[str],
+        workers: int | None = None,
+        verdicts: "TokenVerdicts | None" = None,
+        pages: list[int] | None = None,
+    ) -> list[Misspelling]:
+        """Process PDF and return misspelled words with locations
+
+        `pages` limits the check to those 1-based page numbers.
+        """
+        misspelled: Misspelled = {}
+        for _, page_misspelled in self.iter_misspellings(
+            dictionary, workers, verdicts, pages
+        ):
+            merge_results(misspelled, page_misspelled)
         return list(misspelled.values())
 
 
+class PageTokens:
+    """Words on one page that survive cleaning, stored column-wise
+
+    Bounding boxes are packed four float32 values per word; repeated words
+    are interned so a document's token tables share one copy of each string.
+    `blocks` holds the index of the first word of each text block (as laid
+    out by PyMuPDF), so blocks repeated across sheets can be checked once.
+    """
+
+    __slots__ = ("bboxes", "blocks", "cleaned", "words")
+
+    def __init__(self):
+        self.words: list[str] = []
+        self.cleaned: list[str] = []
+        self.bboxes: array = array("f")
+        self.blocks: array = array("I")
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __getstate__(self):
+        return self.words, self.cleaned, self.bboxes, self.blocks
+
+    def __setstate__(self, state):
+        self.words, self.cleaned, self.bboxes, self.blocks = state
+
+    def append(self, word: str, cleaned: str, bbox):
+        self.words.append(sys.intern(word))
+        self.cleaned.append(sys.intern(cleaned))
+        self.bboxes.extend(bbox)
+
+    def start_block(self):
+        """Start a new text block at the next appended word"""
+        if not self.blocks or self.blocks[-1] != len(self.words):
+            self.blocks.append(len(self.words))
+
+    def block_spans(self) -> Iterator[tuple[int, int]]:
+        """Yield `(start, stop)` word indexes of each non-empty block
+
+        Words appended without `start_block` form a single block.
+        """
+        starts = self.blocks.tolist()
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+        for start, stop in zip(starts, [*starts[1:], len(self.words)]):
+            if start < stop:
+                yield start, stop
+
+    def bbox(self, idx: int) -> tuple[float, float, float, float]:
+        return tuple(self.bboxes[idx * 4 : idx * 4 + 4])
+
+
+def page_fingerprint(doc, page) -> str:
+    """Hash what a page draws: its content, form XObjects, fonts and markup
+
+    Annotations (clouds, stamps, free-text notes) are extracted with the
+    page, so each one's appearance and info are hashed too, as are the
+    fonts' names, encodings and ToUnicode maps. Pages that are unchanged
+    between two revisions of a drawing set hash the same even though the
+    files (and their object numbers) differ. This is about 20x cheaper than
+    extracting the page's words.
+    """
+    digest = hashlib.sha256(page.read_contents())
+    digest.update(f"{page.rotation}|{tuple(page.rect)}".encode())
+    for xref, name, *_ in page.get_xobjects():
+        digest.update(name.encode())
+        digest.update(doc.xref_stream(xref) or b"")
+    for xref, _, font_type, basefont, name, encoding, *_ in page.get_fonts():
+        digest.update(f"{font_type}|{basefont}|{name}|{encoding}".encode())
+        digest.update(_referenced_stream(doc, xref, "ToUnicode"))
+    for annot in page.annots():
+        info = sorted(annot.info.items())
+        digest.update(f"{annot.type[1]}|{tuple(annot.rect)}|{info}".encode())
+        digest.update(_referenced_stream(doc, annot.xref, "AP/N"))
+    return digest.hexdigest()
+
+
+def _referenced_stream(doc, xref: int, key: str) -> bytes:
+    """Contents of the stream that object `xref` references under `key`"""
+    kind, value = doc.xref_get_key(xref, key)
+    if kind != "xref":
+        return b""
+    return doc.xref_stream(int(value.split()[0])) or b""
+
+
+def draws_text(page) -> bool:
+    """Whether `page` may draw text, judged from its content streams alone
+
+    Text is only drawn between `BT`/`ET` operators, so scanned and
+    vector-only sheets are recognised without interpreting their content.
+    Form XObjects are searched one level deep; a form that calls others is
+    assumed to draw text, and so is any annotation (free text, stamps and
+    review markups are extracted with the page).
+    """
+    if b"BT" in page.read_contents() or page.first_annot is not None:
+        return True
+    doc = page.parent
+    for xref, *_ in page.get_xobjects():
+        stream = doc.xref_stream(xref) or b""
+        if b"BT" in stream or b"Do" in stream:
+            return True
+    return False
+
+
+def extract_page(page, profile: ExtractionProfile = DEFAULT_PROFILE) -> PageTokens:
+    """Extract the words on `page` that have a cleaned form"""
+    rec = recorder()
+    page_num = page.number + 1
+    tokens = PageTokens()
+    with rec.span("extract_page", page=page_num):
+        if profile.skip_textless and not draws_text(page):
+            return tokens
+        with rec.span("get_text", page=page_num):
+            # One TextPage, built with only what word boxes need
+            textpage = page.get_textpage(clip=profile.clip, flags=profile.flags)
+            words = textpage.extractWORDS()
+        with rec.span("clean_words", page=page_num):
+            cleaned = clean_words([word_info[4] for word_info in words])
+        block_no = None
+        for word_info, cleaned_word in zip(words, cleaned):
+            if cleaned_word:
+                if word_info[5] != block_no:
+                    block_no = word_info[5]
+                    tokens.start_block()
+                tokens.append(word_info[4], cleaned_word, word_info[:4])
+    return tokens
+
+
+class TokenVerdicts:
+    """Bounded memo of raw token -> misspelling key for one spell-check run
+
+    Drawing sets repeat the same few thousand tokens over and over, so each
+    distinct token is looked up in the dictionary once; the verdict is the
+    `(original.upper(), cleaned)` key for a misspelled token, or None. Once
+    `max_size` tokens are memoized, new tokens are checked but not stored.
+
+    Whole text blocks (title blocks, revision tables, general notes) repeat
+    on every sheet as well, so `blocks` memoizes each distinct block's
+    misspelled words by their position in the block, up to `max_blocks`.
+    """
+
+    __slots__ = (
+        "block_lookups",
+        "block_misses",
+        "blocks",
+        "dictionary",
+        "lookups",
+        "max_blocks",
+        "max_size",
+        "misses",
+        "verdicts",
+    )
+
+    def __init__(
+        self,
+        dictionary: Container[str],
+        max_size: int = TOKEN_CACHE_SIZE,
+        max_blocks: int = BLOCK_CACHE_SIZE,
+    ):
+        self.dictionary = dictionary
+        self.max_size = max_size
+        self.verdicts: dict[str, tuple[str, str] | None] = {}
+        self.lookups = 0
+        self.misses = 0
+        self.max_blocks = max_blocks
+        self.blocks: dict[tuple[str, ...], BlockVerdict] = {}
+        self.block_lookups = 0
+        self.block_misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self.lookups - self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def resolve(self, word: str, cleaned: str) -> tuple[str, str] | None:
+        """Look `word` up in the dictionary and memoize the verdict"""
+        self.misses += 1
+        key = None if cleaned in self.dictionary else (word.upper(), cleaned)
+        if len(self.verdicts) < self.max_size:
+            self.verdicts[word] = key
+        return key
+
+    def resolve_block(
+        self, block: tuple[str, ...], cleaned: list[str]
+    ) -> "BlockVerdict":
+        """Check each word of `block` and memoize where its misspellings are"""
+        self.block_misses += 1
+        self.lookups += len(block)
+        memo = self.verdicts
+        found = []
+        for offset, (word, cleaned_word) in enumerate(zip(block, cleaned)):
+            key = memo.get(word, _UNSEEN)
+            if key is _UNSEEN:
+                key = self.resolve(word, cleaned_word)
+            if key is not None:
+                found.append((offset, key))
+        verdict = tuple(found)
+        if len(self.blocks) < self.max_blocks:
+            self.blocks[block] = verdict
+        return verdict
+
+
+# Misspelled words of a text block, as `(offset in block, misspelling key)`
+BlockVerdict = tuple[tuple[int, tuple[str, str]], ...]
+
+
+def check_tokens(
+    tokens: PageTokens,
+    page_num: int,
+    verdicts: TokenVerdicts,
+    misspelled: Misspelled,
+):
+    """Add the misspelled words in `tokens` (1-based `page_num`) to `misspelled`
+
+    Blocks already checked in this run are not checked again: their memoized
+    misspellings are placed at this occurrence's word positions.
+    """
+    memo = verdicts.blocks
+    words, cleaned, bboxes = tokens.words, tokens.cleaned, tokens.bboxes
+    for start, stop in tokens.block_spans():
+        block = tuple(words[start:stop])
+        verdicts.block_lookups += 1
+        found = memo.get(block)
+        if found is None:
+            found = verdicts.resolve_block(block, cleaned[start:stop])
+
+        for offset, key in found:
+            idx = start + offset
+            entry = misspelled.get(key)
+            if entry is None:
+                entry = misspelled[key] = Misspelling(words[idx], cleaned[idx])
+            entry.pages.append(page_num)
+            entry.bboxes.extend(bboxes[idx * 4 : idx * 4 + 4])
+
+
+def add_highlights(doc, words_to_highlight: list[Misspelling]):
+    """Annotate `doc` with one highlight per word per page"""
+    rec = recorder()
+    for page_idx, words in sorted(group_by_page(words_to_highlight).items()):
+        page = doc[page_idx]
+        with rec.span("annotate_page", page=page_idx + 1):
+            for word, rects in words.items():
+                annot = page.add_highlight_annot(quads=merge_rects(rects))
+                annot.set_colors(stroke=HIGHLIGHT_COLOR)
+                annot.set_info(content=word)
+                annot.update(opacity=0.3)  # Semi-transparent
+        rec.count("annotations", len(words))
+
+
+def group_by_page(
+    misspellings: list[Misspelling],
+) -> dict[int, dict[str, list["fitz.Rect"]]]:
+    """Regroup word-major results as `{page_idx: {word: [rect, ...]}}`"""
+    by_page: dict[int, dict[str, list[fitz.Rect]]] = {}
+    for entry in misspellings:
+        for page_idx, rect in entry.rects():
+            by_page.setdefault(page_idx, {}).setdefault(entry.original, []).append(rect)
+    return by_page
+
+
+def merge_rects(rects: list["fitz.Rect"]) -> list["fitz.Rect"]:
+    """Merge rectangles that touch or overlap into their bounding rectangles"""
+    # Sweep top to bottom; only rects still reaching the current top edge
+    # ("active") can touch the next one.
+    done: list[fitz.Rect] = []
+    active: list[fitz.Rect] = []
+    for rect in sorted(rects, key=lambda r: (r.y0, r.x0)):
+        rect = fitz.Rect(rect)
+        done.extend(other for other in active if other.y1 < rect.y0)
+        active = [other for other in active if other.y1 >= rect.y0]
+
+        sweep = rect.y0
+        while True:
+            if touching := [other for other in active if _touches(other, rect)]:
+                active = [other for other in active if not _touches(other, rect)]
+            elif rect.y0 < sweep and (
+                touching := [other for other in done if _touches(other, rect)]
+            ):
+                # Merging stretched the rect back above the sweep line, onto
+                # rects already moved to `done`.
+                done = [other for other in done if not _touches(other, rect)]
+            else:
+                break
+            for other in touching:
+                rect.include_rect(other)
+        active.append(rect)
+    return sorted(done + active, key=lambda r: (r.y0, r.x0))
+
+
+def _touches(a: "fitz.Rect", b: "fitz.Rect") -> bool:
+    return a.x0 <= b.x1 and b.x0 <= a.x1 and a.y0 <= b.y1 and b.y0 <= a.y1
+
+
+def parse_page_ranges(text: str, page_count: int) -> list[int]:
+    """Parse a page selection like "12-18, 40" into sorted 1-based pages
+
+    Raises ValueError for malformed parts, reversed ranges and pages outside
+    `1..page_count`.
+    """
+    pages: set[int] = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        try:
+            start = int(first)
+            stop = int(last) if sep else start
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r}") from None
+        if start > stop:
+            raise ValueError(f"Invalid page range: {part!r} (start after end)")
+        if start < 1 or stop > page_count:
+            raise ValueError(
+                f"Page range {part!r} is outside the document (1-{page_count})"
+            )
+        pages.update(range(start, stop + 1))
+    return sorted(pages)
+
+
+def format_page_ranges(pages: list[int]) -> str:
+    """Format sorted 1-based pages compactly, e.g. "12-18, 40"
+
+    The inverse of `parse_page_ranges`.
+    """
+    parts = []
+    for page_num in pages:
+        if parts and parts[-1][1] == page_num - 1:
+            parts[-1][1] = page_num
+        else:
+            parts.append([page_num, page_num])
+    return ", ".join(
+        str(start) if start == stop else f"{start}-{stop}" for start, stop in parts
+    )
+
+
+def _shard_pages(page_count: int, shard_count: int) -> list[range]:
+    """Split `range(page_count)` into at most `shard_count` contiguous ranges"""
+    shard_count = max(1, min(shard_count, page_count))
+    size, extra = divmod(page_count, shard_count)
+    shards, start = [], 0
+    for idx in range(shard_count):
+        stop = start + size + (1 if idx < extra else 0)
+        shards.append(range(start, stop))
+        start = stop
+    return shards
+
+
+def merge_results(target: Misspelled, misspelled: Misspelled):
+    """Merge results for later pages into `target`, preserving page order"""
+    for key, entry in misspelled.items():
+        if key not in target:
+            target[key] = entry
+            continue
+        target[key].extend(entry)
+
+
+# Per-process state for pool workers, set once by `_init_worker` so the PDF
+# is not re-sent for every shard.
+_worker_doc = None
+_worker_profile: ExtractionProfile = DEFAULT_PROFILE
+
+
+def _init_worker(
+    source: Path | bytes,
+    profile: ExtractionProfile = DEFAULT_PROFILE,
+    instrumented: bool = False,
+):
+    global _worker_doc, _worker_profile
+    _worker_profile = profile
+    if isinstance(source, Path):
+        _worker_doc = fitz.open(source)
+    else:
+        _worker_doc = fitz.open(stream=source, filetype="pdf")
+    if instrumented:
+        set_recorder(Recorder())
+
+
+def _extract_shard(
+    pages: range | list[int],
+) -> tuple[list[tuple[int, PageTokens]], list[Span]]:
+    """Extract a shard; also returns (and clears) the worker's recorded spans"""
+    shard = [
+        (page_idx + 1, extract_page(_worker_doc[page_idx], _worker_profile))
+        for page_idx in pages
+    ]
+    rec = recorder()
+    if not rec.enabled:
+        return shard, []
+    spans, rec.spans = rec.spans, []
+    return shard, spans
+
+
+# `clean_words` applies the `clean_word` rules to many words at once by
+# running each step over one newline-joined string.
+_STRIP_CHARS = re.compile(r"[^A-Za-z0-9\n-]")
+_EDGE_HYPHENS = re.compile(r"^-+|-+$", re.MULTILINE)
+_HAS_DIGIT = re.compile(r"^.*[0-9].*$", re.MULTILINE)
+
+
+def clean_words(words: list[str]) -> list[str | None]:
+    """Clean a batch of words; same result as `clean_word` on each one
+
+    Each distinct word is cleaned once, and every cleaning step is a single
+    regex pass over all of them.
+    """
+    unique = list(dict.fromkeys(words))
+    joined = "\n".join(unique)
+    if joined.count("\n") != len(unique) - 1:
+        # A word contains a newline and would break the line-based batch.
+        return [clean_word(word) for word in words]
+
+    joined = _STRIP_CHARS.sub("", joined).upper()
+    joined = _EDGE_HYPHENS.sub("", joined)
+    joined = _HAS_DIGIT.sub("", joined)
+    cleaned = dict(zip(unique, joined.split("\n")))
+    return [cleaned[word] or None for word in words]
+
+
 def clean_word(word):
     """Clean and normalize words according to PRD rules"""
     cleaned = re.sub(r"[^A-Za-z0-9-]", "", word)
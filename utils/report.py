@@ -0,0 +1,110 @@
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import TextIO
+
+from utils.pdf import Misspelling
+
+CSV_FIELDS: list[str] = ["Word", "Occurrences", "Pages"]
+COMBINED_CSV_FIELDS: list[str] = ["Word", "Occurrences", "Files", "Pages"]
+
+
+@dataclass
+class CombinedMisspelling:
+    """A misspelled word across several documents, by document name"""
+
+    original: str
+    cleaned: str
+    documents: dict[str, Misspelling] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        """Number of occurrences in all documents"""
+        return sum(len(entry) for entry in self.documents.values())
+
+    def page_list(self) -> str:
+        """Pages per document, e.g. `A.pdf: 1, 2; B.pdf: 7`"""
+        return "; ".join(
+            f"{name}: {entry.page_list()}" for name, entry in self.documents.items()
+        )
+
+
+def combine_results(
+    results: dict[str, list[Misspelling]],
+) -> list[CombinedMisspelling]:
+    """Merge per-document results into one entry per word, in first-seen order"""
+    combined: dict[tuple[str, str], CombinedMisspelling] = {}
+    for name, misspellings in results.items():
+        for entry in misspellings:
+            # Same key as per-document results, so casings don't split rows
+            key = (entry.original.upper(), entry.cleaned)
+            if key not in combined:
+                combined[key] = CombinedMisspelling(entry.original, entry.cleaned)
+            combined[key].documents[name] = entry
+    return list(combined.values())
+
+
+def split_repeated(
+    misspellings: list[Misspelling], page_count: int
+) -> tuple[list[Misspelling], list[Misspelling]]:
+    """Split results into words found on all `page_count` pages and the rest
+
+    Words on every sheet of a set usually come from the title block or the
+    general notes, so they are fixed once rather than sheet by sheet. A single
+    page is never "every sheet"; everything is then in the second list.
+    """
+    if page_count < 2:
+        return [], list(misspellings)
+    repeated, others = [], []
+    for entry in misspellings:
+        (repeated if entry.on_every_page(page_count) else others).append(entry)
+    return repeated, others
+
+
+def write_csv(misspellings: list[Misspelling], f: TextIO):
+    """Write the `Word, Occurrences, Pages` report used by the CSV export"""
+    writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    writer.writerows(
+        {
+            "Word": entry.original,
+            "Occurrences": len(entry),
+            "Pages": entry.page_list(),
+        }
+        for entry in misspellings
+    )
+
+
+def write_json(misspellings: list[Misspelling], f: TextIO):
+    """Write a JSON report with every occurrence's page and bounding box"""
+    json.dump(
+        [
+            {
+                "word": entry.original,
+                "cleaned": entry.cleaned,
+                "occurrences": len(entry),
+                "pages": sorted(set(entry.pages)),
+                "locations": [
+                    {"page": page_idx + 1, "bbox": [round(v, 2) for v in rect]}
+                    for page_idx, rect in entry.rects()
+                ],
+            }
+            for entry in misspellings
+        ],
+        f,
+        indent=2,
+    )
+
+
+def write_combined_csv(combined: list[CombinedMisspelling], f: TextIO):
+    """Write the `Word, Occurrences, Files, Pages` report across documents"""
+    writer = csv.DictWriter(f, fieldnames=COMBINED_CSV_FIELDS)
+    writer.writeheader()
+    writer.writerows(
+        {
+            "Word": entry.original,
+            "Occurrences": len(entry),
+            "Files": len(entry.documents),
+            "Pages": entry.page_list(),
+        }
+        for entry in combined
+    )
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO
+
+TEMP_DIR: Path = Path(tempfile.gettempdir()) / "pdf-spellcheck"
+
+# Uploaded PDFs are spooled here, named by content hash
+UPLOADS_DIR_NAME: str = "uploads"
+
+# Temp files older than this are removed by `cleanup_temp_files`
+TEMP_MAX_AGE: float = 60 * 60
+
+# Spooled uploads are kept longer: sessions reopen them on every rerun
+UPLOAD_MAX_AGE: float = 24 * 60 * 60
+
+# How often the background cleanup thread runs
+CLEANUP_INTERVAL: float = 10 * 60
+
+_cleanup_lock = threading.Lock()
+_cleanup_thread: threading.Thread | None = None
+
+
+def new_temp_path(suffix: str = "") -> Path:
+    """Return a fresh, unused path in `TEMP_DIR`"""
+    TEMP_DIR.mkdir(parents=True, exist_ok=True)
+    return TEMP_DIR / f"{uuid.uuid4().hex}{suffix}"
+
+
+def new_temp_file(directory: Path, suffix: str = ".tmp") -> BinaryIO:
+    """Create and open a new file in `directory` to write and then rename
+
+    Unlike `tempfile.NamedTemporaryFile`, which creates files only their
+    owner can read (0600), the file gets the default permissions (0666 less
+    the umask), so a compiled dictionary or cache entry written by the batch
+    CLI stays readable by the app running as another user. `name` is the
+    file's path.
+    """
+    return open(Path(directory) / f"{uuid.uuid4().hex}{suffix}", "xb")
+
+
+def spool_upload(upload, chunk_size: int = 1 << 20) -> tuple[str, Path]:
+    """Copy an uploaded file to disk, named by its SHA-256
+
+    The upload is streamed in chunks, so it is never held twice in memory.
+    Returns `(digest, path)`; re-uploading the same content reuses the
+    existing file.
+    """
+    uploads_dir = TEMP_DIR / UPLOADS_DIR_NAME
+    uploads_dir.mkdir(parents=True, exist_ok=True)
+    upload.seek(0)
+    digest = hashlib.sha256()
+    with new_temp_file(uploads_dir) as f:
+        while chunk := upload.read(chunk_size):
+            digest.update(chunk)
+            f.write(chunk)
+
+    path = uploads_dir / f"{digest.hexdigest()}.pdf"
+    if path.exists():
+        os.unlink(f.name)
+        os.utime(path)
+    else:
+        shutil.move(f.name, path)
+    return digest.hexdigest(), path
+
+
+def cleanup_temp_files(
+    max_age: float = TEMP_MAX_AGE, upload_max_age: float = UPLOAD_MAX_AGE
+) -> int:
+    """Delete temp files last modified more than `max_age` seconds ago
+
+    Spooled uploads use `upload_max_age` instead. Returns the number of files
+    removed. Files that are still open elsewhere (Windows refuses to delete
+    them) are left for the next run.
+    """
+    now = time.time()
+    removed = 0
+    for directory, cutoff in (
+        (TEMP_DIR, now - max_age),
+        (TEMP_DIR / UPLOADS_DIR_NAME, now - upload_max_age),
+    ):
+        for path in directory.glob("*"):
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+    return removed
+
+
+def start_cleanup_thread(
+    interval: float = CLEANUP_INTERVAL, max_age: float = TEMP_MAX_AGE
+):
+    """Run `cleanup_temp_files` every `interval` seconds in this process
+
+    Safe to call on every Streamlit rerun; only one thread is ever started.
+    """
+    global _cleanup_thread
+    with _cleanup_lock:
+        if _cleanup_thread is not None and _cleanup_thread.is_alive():
+            return
+
+        def _run():
+            while True:
+                cleanup_temp_files(max_age)
+                time.sleep(interval)
+
+        _cleanup_thread = threading.Thread(
+            target=_run, name="temp-file-cleanup", daemon=True
+        )
+        _cleanup_thread.start()
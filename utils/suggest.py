@@ -0,0 +1,242 @@
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO
+
+from utils.dictionary import (
+    DictionaryIndex,
+    DictionarySet,
+    RevisionCache,
+    open_index,
+    write_compiled,
+)
+from utils.instrument import recorder
+
+# Suggestions are words within this many edits (insertions, deletions,
+# substitutions or adjacent transpositions) of the misspelling.
+MAX_DISTANCE: int = 2
+
+# Only the first `PREFIX_LENGTH` characters of each word are indexed
+# (SymSpell's prefix trick); candidates are verified on the whole word.
+PREFIX_LENGTH: int = 7
+
+# Shorter words are only matched one edit away; at two edits almost every
+# short word would be a candidate.
+SHORT_WORD_LENGTH: int = 4
+
+# Memoized candidate lists (one per dictionary index and word) per process
+SUGGESTION_CACHE_SIZE: int = 50_000
+
+SUGGESTIONS_SUFFIX: str = ".sym"
+
+# Layout of a suggestion index (next to its compiled dictionary, all
+# integers native-endian uint32 after the header):
+#   header   magic, group count, delete count
+#   starts   group count + 1 indexes of each group's first word; a group is
+#            the run of (sorted) words sharing a prefix
+#   keys     crc32 of every delete of every group prefix, sorted
+#   groups   group of the delete at the same position in `keys`
+_MAGIC: bytes = b"PSCSYM1" + sys.byteorder[0].encode()
+_HEADER = struct.Struct("=8sII")
+
+
+def compile_suggestions(index_path: Path) -> Path:
+    """Build the symmetric-delete index for a compiled dictionary
+
+    Returns the path of the suggestion index next to `index_path`, building
+    it first if needed. It is removed with its dictionary index when the
+    source file changes.
+    """
+    sym_path = index_path.with_suffix(SUGGESTIONS_SUFFIX)
+    if sym_path.exists():
+        return sym_path
+
+    with recorder().span("compile_suggestions", file=index_path.name):
+        index = open_index(index_path)
+        starts = array("I")
+        # Bucket by the top byte of the hash so each sort stays small.
+        buckets = [array("Q") for _ in range(256)]
+        previous = None
+        for idx in range(len(index)):
+            prefix = index._word_bytes(idx)[:PREFIX_LENGTH]
+            if prefix == previous:
+                continue
+            previous = prefix
+            group = len(starts)
+            starts.append(idx)
+            for delete in _deletes(prefix, MAX_DISTANCE):
+                key = zlib.crc32(delete)
+                buckets[key >> 24].append(key << 32 | group)
+        starts.append(len(index))
+
+        keys, groups = array("I"), array("I")
+        for bucket in buckets:
+            for pair in sorted(bucket):
+                keys.append(pair >> 32)
+                groups.append(pair & 0xFFFFFFFF)
+
+        def write(f: BinaryIO):
+            f.write(_HEADER.pack(_MAGIC, len(starts) - 1, len(keys)))
+            starts.tofile(f)
+            keys.tofile(f)
+            groups.tofile(f)
+
+        write_compiled(sym_path, write)
+    return sym_path
+
+
+def _deletes(word: bytes, max_distance: int) -> set[bytes]:
+    """`word` and every string made by deleting up to `max_distance` bytes"""
+    deletes = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {
+            candidate[:pos] + candidate[pos + 1 :]
+            for candidate in frontier
+            for pos in range(len(candidate))
+        }
+        deletes |= frontier
+    return deletes
+
+
+class SuggestionIndex:
+    """Memory-mapped symmetric-delete index over one compiled dictionary"""
+
+    def __init__(self, sym_path: Path, words: DictionaryIndex):
+        self.path = sym_path
+        self.words = words
+        with open(sym_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, group_count, key_count = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC:
+            raise ValueError(f"{sym_path} is not a suggestion index")
+
+        view = memoryview(self._mmap)
+        start = _HEADER.size
+        self._starts = view[start : start + 4 * (group_count + 1)].cast("I")
+        start += 4 * (group_count + 1)
+        self._keys = view[start : start + 4 * key_count].cast("I")
+        start += 4 * key_count
+        self._groups = view[start : start + 4 * key_count].cast("I")
+
+    def candidates(self, word: str, max_distance: int = MAX_DISTANCE) -> dict[str, int]:
+        """Dictionary words within `max_distance` edits, with their distance"""
+        encoded = word.encode("utf-8")
+        keys, groups, starts = self._keys, self._groups, self._starts
+        seen_groups: set[int] = set()
+        found: dict[str, int] = {}
+        for delete in _deletes(encoded[:PREFIX_LENGTH], max_distance):
+            key = zlib.crc32(delete)
+            pos = bisect_left(keys, key)
+            while pos < len(keys) and keys[pos] == key:
+                seen_groups.add(groups[pos])
+                pos += 1
+
+        for group in seen_groups:
+            for idx in range(starts[group], starts[group + 1]):
+                candidate = self.words._word_bytes(idx)
+                if abs(len(candidate) - len(encoded)) > max_distance:
+                    continue
+                distance = edit_distance(encoded, candidate, max_distance)
+                if distance <= max_distance:
+                    found[candidate.decode("utf-8")] = distance
+        return found
+
+
+_suggestion_indexes: RevisionCache[SuggestionIndex] = RevisionCache(
+    lambda index_path: SuggestionIndex(
+        compile_suggestions(index_path), open_index(index_path)
+    )
+)
+
+
+def open_suggestions(index_path: Path) -> SuggestionIndex:
+    """Open (once per process, building it if needed) a dictionary's index"""
+    return _suggestion_indexes.get(index_path)
+
+
+def suggest(dictionary: DictionarySet, word: str, top: int = 3) -> list[str]:
+    """Up to `top` dictionary words closest to `word`, closest first
+
+    `word` should be cleaned (see `clean_word`), like the dictionary entries.
+    Words of up to `SHORT_WORD_LENGTH` characters only get suggestions one
+    edit away. Ties are broken by length difference, then alphabetically.
+    Candidates are memoized per dictionary index, so changing the selection
+    only looks up the newly selected dictionaries.
+    """
+    max_distance = 1 if len(word) <= SHORT_WORD_LENGTH else MAX_DISTANCE
+    found: dict[str, int] = {}
+    for index in dictionary.indexes:
+        for candidate, distance in _candidates(index.path, word, max_distance):
+            found[candidate] = min(distance, found.get(candidate, distance))
+    found.pop(word, None)
+    ranked = sorted(found, key=lambda x: (found[x], abs(len(x) - len(word)), x))
+    return ranked[:top]
+
+
+@lru_cache(maxsize=SUGGESTION_CACHE_SIZE)
+def _candidates(
+    index_path: Path, word: str, max_distance: int
+) -> tuple[tuple[str, int], ...]:
+    candidates = open_suggestions(index_path).candidates(word, max_distance)
+    return tuple(candidates.items())
+
+
+def edit_distance(a: bytes, b: bytes, max_distance: int) -> int:
+    """Optimal string alignment distance, or `max_distance + 1` if larger
+
+    Only the diagonal band of the table that can stay within `max_distance`
+    is filled, and common prefixes and suffixes are skipped, so checking a
+    candidate costs a few microseconds.
+    """
+    if a == b:
+        return 0
+    len_a, len_b = len(a), len(b)
+    too_far = max_distance + 1
+    if abs(len_a - len_b) > max_distance:
+        return too_far
+
+    start, shorter = 0, min(len_a, len_b)
+    while start < shorter and a[start] == b[start]:
+        start += 1
+    while len_a > start and len_b > start and a[len_a - 1] == b[len_b - 1]:
+        len_a -= 1
+        len_b -= 1
+    a, b = a[start:len_a], b[start:len_b]
+    len_a, len_b = len(a), len(b)
+    if not len_a or not len_b:
+        return min(max(len_a, len_b), too_far)
+
+    before_previous = None
+    previous = list(range(len_b + 1))
+    for i in range(1, len_a + 1):
+        row = [too_far] * (len_b + 1)
+        if i <= max_distance:
+            row[0] = i
+        row_min = row[0]
+        char = a[i - 1]
+        for j in range(max(1, i - max_distance), min(len_b, i + max_distance) + 1):
+            other = b[j - 1]
+            cost = previous[j - 1] if char == other else previous[j - 1] + 1
+            cost = min(cost, previous[j] + 1)  # deletion
+            cost = min(cost, row[j - 1] + 1)  # insertion
+            if (
+                before_previous is not None
+                and j > 1
+                and char == b[j - 2]
+                and a[i - 2] == other
+                and before_previous[j - 2] + 1 < cost
+            ):
+                cost = before_previous[j - 2] + 1  # transposition
+            row[j] = cost
+            row_min = min(row_min, cost)
+        if row_min > max_distance:
+            return too_far
+        before_previous, previous = previous, row
+    return min(previous[len_b], too_far)
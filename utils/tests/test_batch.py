@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+
+import fitz
+import pytest
+
+from utils.batch import check_pdf, check_pdf_files, find_pdfs, run_batch, write_zip
+from utils.pdf import Misspelling
+from utils.report import combine_results
+
+
+@pytest.fixture
+def pdf_dir(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ("b.pdf", "a.PDF", "sub/c.pdf"):
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((50, 50), "Hello wrold")
+        doc.save(tmp_path / name)
+    (tmp_path / "notes.txt").write_text("not a pdf")
+    return tmp_path
+
+
+@pytest.fixture
+def dict_file(tmp_path):
+    path = tmp_path / "dicts" / "General.txt"
+    path.parent.mkdir()
+    path.write_text("HELLO\n")
+    return path
+
+
+def test_find_pdfs(pdf_dir):
+    assert [p.name for p in find_pdfs([pdf_dir])] == ["a.PDF", "b.pdf"]
+    assert [p.name for p in find_pdfs([pdf_dir], recursive=True)] == [
+        "a.PDF",
+        "b.pdf",
+        "c.pdf",
+    ]
+    with pytest.raises(FileNotFoundError):
+        find_pdfs([pdf_dir / "missing.pdf"])
+
+
+@pytest.mark.parametrize("report_format", ["csv", "json"])
+def test_run_batch_writes_reports(pdf_dir, dict_file, tmp_path, report_format):
+    out_dir = tmp_path / "out"
+    results = list(
+        run_batch(
+            find_pdfs([pdf_dir]),
+            [dict_file],
+            out_dir,
+            report_format=report_format,
+            highlight=True,
+            workers=1,
+            use_cache=False,
+        )
+    )
+
+    assert [r.error for r in results] == [None, None]
+    assert [r.misspelled for r in results] == [1, 1]
+    assert (out_dir / "a_highlighted.pdf").exists()
+    with open(out_dir / f"a.{report_format}", newline="") as f:
+        if report_format == "csv":
+            rows = list(csv.DictReader(f))
+            assert rows == [{"Word": "wrold", "Occurrences": "1", "Pages": "1"}]
+        else:
+            assert json.load(f)[0]["word"] == "wrold"
+
+
+def test_run_batch_keeps_reports_of_same_named_files_apart(
+    pdf_dir, dict_file, tmp_path
+):
+    (pdf_dir / "other").mkdir()
+    (pdf_dir / "other" / "b.pdf").write_bytes((pdf_dir / "b.pdf").read_bytes())
+    out_dir = tmp_path / "out"
+
+    results = list(
+        run_batch(
+            find_pdfs([pdf_dir], recursive=True),
+            [dict_file],
+            out_dir,
+            workers=2,
+            use_cache=False,
+        )
+    )
+
+    assert [r.error for r in results] == [None] * 4
+    assert sorted(p.name for p in out_dir.iterdir()) == [
+        "a.csv",
+        "b.csv",
+        "b_.csv",
+        "c.csv",
+    ]
+
+
+def test_run_batch_reports_failures(tmp_path, dict_file):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+
+    (result,) = run_batch([broken], [dict_file], tmp_path / "out", workers=1)
+
+    assert result.error is not None
+
+
+def test_batch_does_not_import_streamlit():
+    code = "import sys, utils.batch; print('streamlit' in sys.modules)"
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parents[2],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert output.strip().endswith("False")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_check_pdf_files_reports_each_file(pdf_dir, dict_file, tmp_path, workers):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    documents = [
+        ("a.pdf", pdf_dir / "a.PDF", None),
+        ("broken.pdf", broken, None),
+        ("b.pdf", pdf_dir / "b.pdf", None),
+    ]
+
+    results = {
+        name: (misspellings, error)
+        for name, misspellings, error in check_pdf_files(
+            documents, [dict_file], workers=workers, use_cache=False
+        )
+    }
+
+    assert [x.original for x in results["a.pdf"][0]] == ["wrold"]
+    assert [x.original for x in results["b.pdf"][0]] == ["wrold"]
+    assert results["broken.pdf"][0] is None
+    assert results["broken.pdf"][1] is not None
+
+
+def test_write_zip(pdf_dir, dict_file, tmp_path):
+    documents = [
+        (name, path, check_pdf(path, [dict_file])[1])
+        for name, path in (("a.pdf", pdf_dir / "a.PDF"), ("b.pdf", pdf_dir / "b.pdf"))
+    ]
+    documents.append(("a.PDF", pdf_dir / "b.pdf", []))  # same stem, nothing found
+
+    buffer = io.BytesIO()
+    write_zip(buffer, documents)
+
+    with zipfile.ZipFile(buffer) as archive:
+        assert sorted(archive.namelist()) == [
+            "a.csv",
+            "a_.csv",
+            "a_highlighted.pdf",
+            "all_files.csv",
+            "b.csv",
+            "b_highlighted.pdf",
+        ]
+        combined = list(
+            csv.DictReader(io.StringIO(archive.read("all_files.csv").decode()))
+        )
+        with fitz.open(stream=archive.read("a_highlighted.pdf")) as doc:
+            assert len(list(doc[0].annots())) == 1
+
+    assert combined == [
+        {
+            "Word": "wrold",
+            "Occurrences": "2",
+            "Files": "2",
+            "Pages": "a.pdf: 1; b.pdf: 1",
+        }
+    ]
+
+
+def test_combine_results_merges_casings():
+    combined = combine_results(
+        {
+            "A.pdf": [Misspelling("Wrold", "WROLD")],
+            "B.pdf": [Misspelling("wrold", "WROLD")],
+        }
+    )
+
+    assert [(x.original, list(x.documents)) for x in combined] == [
+        ("Wrold", ["A.pdf", "B.pdf"])
+    ]
@@ -0,0 +1,184 @@
+import io
+import os
+
+import fitz
+
+from utils.cache import (
+    MemoryCache,
+    ResultCache,
+    dictionary_fingerprint,
+    load_page_tokens,
+    page_key,
+    results_key,
+    store_page_tokens,
+    words_key,
+)
+from utils.pdf import Pdf
+
+
+def test_result_cache_round_trip(tmp_path):
+    cache = ResultCache(directory=tmp_path)
+
+    assert cache.get("missing") is None
+    cache.put("key", [{"original": "Hello", "pages": [1]}])
+    assert cache.get("key") == [{"original": "Hello", "pages": [1]}]
+
+
+def test_result_cache_drops_corrupt_entries(tmp_path):
+    cache = ResultCache(directory=tmp_path)
+    (tmp_path / "key.pkl").write_bytes(b"not a pickle")
+
+    assert cache.get("key") is None
+    assert not (tmp_path / "key.pkl").exists()
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(directory=tmp_path, max_bytes=10_000)
+    cache.put("old", b"x" * 4_000)
+    cache.put("used", b"x" * 4_000)
+    os.utime(tmp_path / "old.pkl", ns=(1, 1))
+    os.utime(tmp_path / "used.pkl", ns=(2, 2))
+    cache.get("used")
+
+    cache.put("new", b"x" * 4_000)
+
+    assert cache.get("old") is None
+    assert cache.get("used") is not None
+    assert cache.get("new") is not None
+
+
+def test_dictionary_fingerprint_tracks_file_changes(tmp_path):
+    civil, general = tmp_path / "Civil.txt", tmp_path / "General.txt"
+    civil.write_text("ABN\n")
+    general.write_text("CONC\n")
+    before = dictionary_fingerprint([civil, general])
+
+    assert dictionary_fingerprint([general, civil]) == before
+    assert dictionary_fingerprint([general]) != before
+
+    civil.write_text("ABN\nALGN\n")
+    assert dictionary_fingerprint([civil, general]) != before
+
+
+def test_results_key_depends_on_page_selection(tmp_path):
+    dict_file = tmp_path / "words.txt"
+    dict_file.write_text("HELLO\n")
+
+    full = results_key("abc", [dict_file])
+    assert results_key("abc", [dict_file], [1, 2]) != full
+    assert results_key("abc", [dict_file], [1, 2]) != results_key(
+        "abc", [dict_file], [1, 3]
+    )
+
+
+def test_page_tokens_are_reused_across_revisions(tmp_path):
+    cache = ResultCache(tmp_path)
+    pages = ["Hello wrold", "Sheet two", "Sheet three"]
+    first_bytes = _make_pdf(pages)
+    first = Pdf(io.BytesIO(first_bytes))
+    load_page_tokens(cache, first)
+    first.process_pdf({"HELLO"}, workers=1)
+    store_page_tokens(cache, first)
+
+    revised = Pdf(io.BytesIO(_make_pdf(pages[:2] + ["Sheet thre"])))
+    load_page_tokens(cache, revised)
+    revised.process_pdf({"HELLO"}, workers=1)
+
+    assert revised.changed_pages == [3]
+    assert revised.pages_extracted == 1
+
+    # The same document again is restored whole, without fingerprinting
+    again = Pdf(io.BytesIO(first_bytes))
+    load_page_tokens(cache, again)
+    assert again.changed_pages is None
+    assert None not in again.page_tokens
+
+
+def test_document_entry_lists_page_entries(tmp_path):
+    cache = ResultCache(tmp_path)
+    data = _make_pdf(["Hello wrold", "Sheet two", "Sheet three"])
+    first = Pdf(io.BytesIO(data))
+    first.process_pdf({"HELLO"}, workers=1)
+    store_page_tokens(cache, first)
+
+    # Tokens are stored once per page; the document only lists their keys
+    fingerprints = cache.get(words_key(first.digest))
+    assert fingerprints == [first.fingerprint(n) for n in (1, 2, 3)]
+
+    (tmp_path / f"{page_key(fingerprints[1])}.pkl").unlink()
+    again = Pdf(io.BytesIO(data))
+    load_page_tokens(cache, again)
+    assert again.process_pdf({"HELLO"}, workers=1)[0].original == "wrold"
+    assert again.pages_extracted == 1  # only the evicted page
+    assert again.changed_pages is None
+
+
+def test_revision_changing_only_markup_is_re_extracted(tmp_path):
+    cache = ResultCache(tmp_path)
+    pages = ["Hello wrold", "Sheet two"]
+    first = Pdf(io.BytesIO(_make_pdf(pages)))
+    first.process_pdf({"HELLO", "SHEET", "TWO"}, workers=1)
+    store_page_tokens(cache, first)
+
+    doc = fitz.open(stream=_make_pdf(pages))
+    doc[0].add_freetext_annot(fitz.Rect(50, 100, 300, 130), "Revison clouud")
+    revised = Pdf(io.BytesIO(doc.tobytes()))
+    load_page_tokens(cache, revised)
+    misspelled = revised.process_pdf({"HELLO", "SHEET", "TWO"}, workers=1)
+
+    assert revised.changed_pages == [1]
+    assert sorted(x.original for x in misspelled) == ["Revison", "clouud", "wrold"]
+
+
+def _make_pdf(texts: list[str]) -> bytes:
+    doc = fitz.open()
+    for text in texts:
+        doc.new_page().insert_text((50, 50), text)
+    return doc.tobytes()
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.put("old", 1)
+    cache.put("used", 2)
+    cache.get("used")
+
+    cache.put("new", 3)
+
+    assert "old" not in cache
+    assert cache.get("used") == 2
+    assert cache.get("new") == 3
+
+
+def test_page_tokens_round_trip_through_memory_cache():
+    doc = fitz.open()
+    for page_num in range(3):
+        doc.new_page().insert_text((50, 50), f"Hello wrold {page_num}")
+    data = doc.tobytes()
+    cache = MemoryCache()
+
+    first = Pdf(io.BytesIO(data))
+    first.process_pdf({"HELLO"})
+    store_page_tokens(cache, first)
+
+    second = Pdf(io.BytesIO(data))
+    load_page_tokens(cache, second)
+    assert second.process_pdf({"HELLO"}, workers=1)[0].original == "wrold"
+    assert second.pages_extracted == 0
+
+
+def test_page_selection_only_fingerprints_selected_pages(tmp_path):
+    cache = MemoryCache()
+    pages = [f"Sheet {word}" for word in ("one", "two", "three", "four", "five")]
+    first = Pdf(io.BytesIO(_make_pdf(pages)))
+    first.process_pdf({"SHEET"}, workers=1)
+    store_page_tokens(cache, first)
+
+    revised = Pdf(io.BytesIO(_make_pdf(pages[:4] + ["Sheet fiv"])))
+    load_page_tokens(cache, revised, pages=[2, 5])
+    revised.process_pdf({"SHEET"}, workers=1, pages=[2, 5])
+    store_page_tokens(cache, revised)
+
+    assert revised.changed_pages == [5]
+    assert revised.pages_extracted == 1
+    assert sorted(revised._fingerprints) == [2, 5]
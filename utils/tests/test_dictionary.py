@@ -1,7 +1,41 @@
+import os
+import pickle
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from unittest.mock import patch
 
-from utils.dictionary import load_dictionaries, load_dictionary
+import pytest
+
+from utils.dictionary import (
+    DictionaryIndex,
+    _indexes,
+    add_words,
+    compile_dictionary,
+    compile_merged,
+    load_compiled_dictionaries,
+    load_dictionaries,
+    load_dictionary,
+    open_index,
+)
+
+
+@pytest.fixture
+def dict_file(tmp_path):
+    """Write `<name>.txt` in `tmp_path`, one word per line"""
+
+    def write(name: str, *words: str) -> Path:
+        path = tmp_path / f"{name}.txt"
+        path.write_text("".join(f"{word}\n" for word in words), encoding="utf-8")
+        return path
+
+    return write
+
+
+def _revise(path: Path, *words: str):
+    """Rewrite a dictionary file as a new revision (new size and mtime)"""
+    path.write_text("".join(f"{word}\n" for word in words), encoding="utf-8")
+    os.utime(path, ns=(1, 1))
 
 
 def test_load_dictionary():
@@ -45,3 +79,150 @@ def test_load_dictionaries(mock_load_dictionary):
     # Verify the function was called with correct arguments
     mock_load_dictionary.assert_any_call(filepath=Path("dict1.txt"))
     mock_load_dictionary.assert_any_call(filepath=Path("dict2.txt"))
+
+
+def test_compiled_dictionary_lookup(dict_file):
+    source = dict_file("Civil", "abn", "  Asph ", "", "ALGN", "Étude")
+
+    index = DictionaryIndex(compile_dictionary(source))
+
+    assert len(index) == 4
+    assert set(index) == {"ABN", "ASPH", "ALGN", "ÉTUDE"}
+    assert "ASPH" in index
+    assert "ÉTUDE" in index
+    assert "asph" not in index
+    assert "" not in index
+
+
+def test_compiled_dictionary_rebuilds_when_source_changes(dict_file):
+    source = dict_file("Civil", "ABN")
+    first = compile_dictionary(source)
+    assert compile_dictionary(source) == first
+
+    _revise(source, "ABN", "ALGN")
+    second = compile_dictionary(source)
+
+    assert second != first
+    assert not first.exists()
+    assert [p.name for p in second.parent.iterdir()] == [second.name]
+
+
+def test_load_compiled_dictionaries(dict_file):
+    civil = dict_file("Civil", "ABN", "ALGN")
+    general = dict_file("General", "CONC")
+
+    dictionary = load_compiled_dictionaries([civil, general])
+
+    assert "ALGN" in dictionary
+    assert "CONC" in dictionary
+    assert "TYP" not in dictionary
+    assert len(dictionary) == 3
+    # Indexes pickle by path, so workers re-map the file instead of copying it
+    assert pickle.loads(pickle.dumps(dictionary.indexes[0])) is dictionary.indexes[0]
+
+
+def test_add_words_appends_only_new_words(tmp_path):
+    source = tmp_path / "Civil.txt"
+    source.write_text("ABN\nALGN")  # no final newline
+
+    added = add_words(source, ["asph", "ABN", " Conc ", ""])
+
+    assert added == ["ASPH", "CONC"]
+    assert source.read_text() == "ABN\nALGN\nASPH\nCONC\n"
+    assert "CONC" in load_compiled_dictionaries([source])
+    assert add_words(source, ["conc"]) == []
+
+
+def test_compiled_dictionaries_are_shared_across_loads(dict_file):
+    civil = dict_file("Civil", "ABN", "ALGN")
+    general = dict_file("General", *(f"WORD{i}" for i in range(50_000)))
+    first = load_compiled_dictionaries([civil, general])
+
+    # Every rerun and session gets the same mapped indexes, not a copy
+    tracemalloc.start()
+    for _ in range(100):
+        again = load_compiled_dictionaries([general, civil])
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert all(a is b for a, b in zip(again.indexes, first.indexes))
+    assert allocated < 100_000
+
+
+def test_new_revision_replaces_shared_index(dict_file):
+    source = dict_file("Civil-Works", "ABN")
+    old = open_index(compile_dictionary(source))
+
+    _revise(source, "ABN", "ALGN")
+    new = open_index(compile_dictionary(source))
+
+    assert "ALGN" in new
+    assert old.path not in _indexes._opened
+    assert new.path in _indexes._opened
+
+
+def test_merged_index_checks_selection_with_masks(tmp_path, dict_file):
+    dict_file("Mech", "HVAC", "CONC")
+    civil = dict_file("Civil", "ABN", "ALGN", "CONC")
+    general = dict_file("General", "CONC", "THE")
+
+    dictionary = load_compiled_dictionaries([civil, general])
+
+    assert dictionary.merged is not None
+    assert dictionary.merged.names == ["Civil", "General", "Mech"]
+    assert "ALGN" in dictionary
+    assert "HVAC" not in dictionary
+    assert "TYP" not in dictionary
+    # Distinct words across the selection, CONC counted once
+    assert len(dictionary) == 4
+    assert dictionary.accepted_by("CONC") == ["Civil", "General"]
+    assert dictionary.found_elsewhere("HVAC") == ["Mech"]
+    assert dictionary.found_elsewhere("ALGN") == []
+    assert "HVAC" in pickle.loads(pickle.dumps(dictionary.merged))
+
+    # Another selection reuses the same merged index
+    merged_path = dictionary.merged.path
+    other = load_compiled_dictionaries([tmp_path / "Mech.txt"])
+    assert other.merged is dictionary.merged
+    assert compile_merged(tmp_path) == merged_path
+    assert "HVAC" in other
+    assert "ALGN" not in other
+    assert other.found_elsewhere("ALGN") == ["Civil"]
+
+
+def test_merged_index_rebuilds_when_a_dictionary_changes(tmp_path, dict_file):
+    civil = dict_file("Civil", "ABN")
+    first = compile_merged(tmp_path)
+
+    _revise(civil, "ABN", "ALGN")
+    second = compile_merged(tmp_path)
+
+    assert second != first
+    assert not first.exists()
+    assert "ALGN" in load_compiled_dictionaries([civil])
+
+
+def _compile_and_count(source: Path) -> int:
+    return len(DictionaryIndex(compile_dictionary(source)))
+
+
+def test_concurrent_compiles_of_one_revision(tmp_path, dict_file):
+    source = dict_file("General", *(f"WORD{i}" for i in range(200_000)))
+
+    with ProcessPoolExecutor(max_workers=8) as executor:
+        counts = list(executor.map(_compile_and_count, [source] * 16))
+
+    assert counts == [200_000] * 16
+    assert [p.suffix for p in (tmp_path / ".compiled").iterdir()] == [".idx"]
+
+
+def test_compiling_keeps_dictionaries_sharing_a_prefix(dict_file):
+    civil = dict_file("Civil", "ABN")
+    extra = dict_file("Civil-Extra", "ALGN")
+    extra_index = compile_dictionary(extra)
+    extra_index.with_suffix(".sym").write_bytes(b"")
+
+    compile_dictionary(civil)
+
+    assert extra_index.exists()
+    assert extra_index.with_suffix(".sym").exists()
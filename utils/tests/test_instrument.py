@@ -0,0 +1,51 @@
+import io
+import json
+
+from utils.instrument import NULL_RECORDER, Recorder, recorder, recording
+
+
+def test_disabled_by_default():
+    assert recorder() is NULL_RECORDER
+    assert not recorder().enabled
+    assert recorder().span("a") is recorder().span("b")
+
+
+def test_recording_restores_previous_recorder():
+    with recording() as rec:
+        assert recorder() is rec
+        with rec.span("stage", page=1):
+            pass
+        rec.count("cache.hits", 3)
+        rec.count("cache.misses")
+    assert recorder() is NULL_RECORDER
+
+    assert rec.stages()["stage"]["calls"] == 1
+    assert rec.hit_ratios() == {"cache": 0.75}
+
+
+def test_chrome_trace():
+    rec = Recorder()
+    with rec.span("outer"), rec.span("inner", page=2):
+        pass
+
+    f = io.StringIO()
+    rec.write_chrome_trace(f)
+    events = json.loads(f.getvalue())["traceEvents"]
+
+    assert [event["name"] for event in events] == ["inner", "outer"]
+    assert all(event["ph"] == "X" for event in events)
+    assert events[0]["args"] == {"page": 2}
+    assert events[1]["ts"] <= events[0]["ts"]
+
+
+def test_merge_labels_spans():
+    job = Recorder()
+    with job.span("extract_page"):
+        pass
+    job.count("tokens", 5)
+
+    rec = Recorder()
+    rec.merge(job, prefix="job: ")
+
+    assert list(rec.stages()) == ["job: extract_page"]
+    assert rec.counters == {"tokens": 5}
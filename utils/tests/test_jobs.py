@@ -0,0 +1,148 @@
+import io
+import threading
+
+import fitz
+
+from utils.cache import ResultCache, results_key, suggestions_key
+from utils.dictionary import (
+    add_words,
+    compile_dictionary,
+    load_compiled_dictionaries,
+)
+from utils.instrument import recorder
+from utils.jobs import JobQueue, build_suggestions, check_document
+from utils.pdf import Pdf
+from utils.suggest import SUGGESTIONS_SUFFIX
+
+
+def test_job_queue_shares_jobs_by_key():
+    queue = JobQueue(max_workers=2)
+    release = threading.Event()
+    calls = []
+
+    def work(job, value):
+        calls.append(value)
+        job.progress(1, 2, "halfway")
+        release.wait(5)
+        return value * 2
+
+    job = queue.submit("key", work, 21)
+    assert queue.submit("key", work, 99) is job
+    assert queue.get("key") is job
+    assert not job.finished
+
+    release.set()
+    assert job.wait(5)
+    assert job.status == "done"
+    assert job.result == 42
+    assert calls == [21]
+    # A finished job is attached to, not re-run
+    assert queue.submit("key", work, 99) is job
+
+
+def test_failed_job_is_replaced_on_resubmit():
+    queue = JobQueue(max_workers=1)
+
+    def fail(job):
+        raise ValueError("bad page")
+
+    job = queue.submit("key", fail)
+    assert job.wait(5)
+    assert job.status == "failed"
+    assert job.error == "ValueError: bad page"
+
+    retry = queue.submit("key", lambda job: "ok")
+    assert retry is not job
+    assert retry.wait(5)
+    assert retry.result == "ok"
+
+
+def test_job_records_into_its_own_recorder():
+    queue = JobQueue(max_workers=1)
+
+    def work(job):
+        recorder().count("pages")
+
+    # Recorded even though diagnostics were off when it was submitted
+    job = queue.submit("key", work)
+    assert job.wait(5)
+    assert job.recorder.counters == {"pages": 1}
+
+
+def test_check_document_matches_process_pdf(tmp_path):
+    doc = fitz.open()
+    for page_num in range(12):
+        doc.new_page().insert_text((50, 50), f"Hello wrold page {page_num}")
+    pdf_path = tmp_path / "upload.pdf"
+    doc.save(pdf_path)
+    dictionary = {"HELLO", "PAGE"}
+    pdf = Pdf(path=pdf_path)
+    cache = ResultCache(directory=tmp_path / "cache")
+    key = results_key(pdf.digest, [])
+
+    job = JobQueue().submit(
+        key, check_document, pdf_path, pdf.digest, dictionary, None, cache, key
+    )
+    assert job.wait(30)
+
+    expected = Pdf(io.BytesIO(pdf_path.read_bytes())).process_pdf(dictionary)
+    assert [x.original for x in cache.get(key)] == [x.original for x in expected]
+    assert (job.done, job.total) == (12, 12)
+    assert job.result == list(range(1, 13))  # changed pages: nothing seen before
+    # The words are only kept in the cache
+    assert job.partial is None
+
+
+def test_build_suggestions_after_adding_words(tmp_path):
+    dict_file = tmp_path / "words.txt"
+    dict_file.write_text("WORLD\n", encoding="utf-8")
+    add_words(dict_file, ["SPELLING"])
+    index_path = compile_dictionary(dict_file)
+
+    job = JobQueue().submit("key", build_suggestions, index_path)
+    assert job.wait(30)
+    assert job.status == "done"
+    assert index_path.with_suffix(SUGGESTIONS_SUFFIX).exists()
+
+
+def test_check_document_stores_suggestions(tmp_path):
+    doc = fitz.open()
+    doc.new_page().insert_text((50, 50), "Hello wrold")
+    pdf_path = tmp_path / "upload.pdf"
+    doc.save(pdf_path)
+    dict_file = tmp_path / "words.txt"
+    dict_file.write_text("HELLO\nWORLD\n", encoding="utf-8")
+    dictionary = load_compiled_dictionaries([dict_file])
+    digest = Pdf(path=pdf_path).digest
+    cache = ResultCache(directory=tmp_path / "cache")
+    key = results_key(digest, [dict_file])
+    cache.put(key, Pdf(path=pdf_path).process_pdf(dictionary))
+
+    job = JobQueue().submit(
+        suggestions_key(key),
+        check_document,
+        pdf_path,
+        digest,
+        dictionary,
+        None,
+        cache,
+        key,
+        suggestions_key(key),
+    )
+    assert job.wait(30)
+
+    # The cached results are reused; only the suggestions are new
+    assert job.result is None
+    assert cache.get(suggestions_key(key)) == {"WROLD": ["WORLD"]}
+
+
+def test_finished_jobs_are_capped():
+    queue = JobQueue(max_workers=1)
+    for number in range(5):
+        assert queue.submit(f"job-{number}", lambda job: None).wait(5)
+
+    queue._prune(max_finished=2)
+
+    assert [queue.get(f"job-{number}") is None for number in range(5)] == [
+        True, True, True, False, False,
+    ]  # fmt: skip
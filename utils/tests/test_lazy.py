@@ -0,0 +1,35 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from benchmarks.suite import CORE_MODULES
+from utils.lazy import lazy_import
+
+
+def test_lazy_import_returns_loaded_module():
+    assert lazy_import("json") is sys.modules["json"]
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import("no_such_module_here")
+
+
+def test_core_leaves_heavy_dependencies_unloaded():
+    # Import time itself is tracked by the benchmark suite's cold_start stage
+    code = (
+        "import sys\n"
+        f"import {', '.join(CORE_MODULES)}\n"
+        "heavy = [m for m in ('fitz', 'pymupdf', 'streamlit', 'pandas')\n"
+        "         if m in sys.modules and not type(sys.modules[m]).__name__\n"
+        "         .startswith('_Lazy')]\n"
+        "print(*heavy)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parents[2],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+
+    assert output == []
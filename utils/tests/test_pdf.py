@@ -1,9 +1,38 @@
 import io
+import pickle
 from unittest.mock import MagicMock, patch
 
+import fitz
 import pytest
 
-from utils.pdf import Pdf, clean_word
+from utils.instrument import recording
+from utils.pdf import (
+    WORD_TEXT_FLAGS,
+    ExtractionProfile,
+    Misspelling,
+    PageTokens,
+    Pdf,
+    TokenVerdicts,
+    _shard_pages,
+    check_tokens,
+    clean_word,
+    clean_words,
+    draws_text,
+    format_page_ranges,
+    merge_rects,
+    merge_results,
+    parse_page_ranges,
+)
+from utils.report import split_repeated
+
+
+def _misspelling(original: str, *occurrences: tuple[int, tuple]) -> Misspelling:
+    """`original` found at each `(page_num, bbox)` of `occurrences`"""
+    entry = Misspelling(original, original.upper())
+    for page_num, bbox in occurrences:
+        entry.pages.append(page_num)
+        entry.bboxes.extend(bbox)
+    return entry
 
 
 @pytest.mark.parametrize(
@@ -23,6 +52,18 @@ def test_clean_word(input_word, expected):
     assert clean_word(input_word) == expected
 
 
+def test_clean_words_matches_clean_word():
+    words = [
+        "Hello", "Hello-World!", "Hello123", "", "   ", "(NBCC)", "TYP.",
+        "--", "-A-", "Ø", "café", "c/w", "Line\nBreak", "(NBCC)", "Hello",
+    ]  # fmt: skip
+
+    assert clean_words(words) == [clean_word(word) for word in words]
+    assert clean_words([w for w in words if "\n" not in w]) == [
+        clean_word(w) for w in words if "\n" not in w
+    ]
+
+
 @pytest.fixture
 def pdf_instance():
     mock_pdf_file = io.BytesIO(b"mock pdf content")
@@ -36,21 +77,58 @@ def test_highlight(mock_fitz_open, pdf_instance):
     mock_page = MagicMock()
     mock_annot = MagicMock()
     mock_fitz_open.return_value = mock_doc
+    mock_doc.__enter__.return_value = mock_doc
     mock_doc.__getitem__.return_value = mock_page
-    mock_page.add_rect_annot.return_value = mock_annot
+    mock_page.add_highlight_annot.return_value = mock_annot
 
-    # Test data
-    words_to_highlight = [{"locations": [{"page": 0, "bbox": (100, 100, 200, 200)}]}]
+    # Test data: two touching occurrences on the first page
+    entry = _misspelling("Wrold", (1, (100, 100, 200, 200)), (1, (200, 100, 250, 200)))
 
     # Call the highlight method
-    _ = pdf_instance.highlight(words_to_highlight)
+    _ = pdf_instance.highlight([entry])
 
     # Verify the interactions
+    mock_fitz_open.assert_called_once_with(stream=b"mock pdf content", filetype="pdf")
     mock_doc.__getitem__.assert_called_once_with(0)
-    mock_page.add_rect_annot.assert_called_once_with((100, 100, 200, 200))
+    mock_page.add_highlight_annot.assert_called_once_with(
+        quads=[fitz.Rect(100, 100, 250, 200)]
+    )
     mock_annot.set_colors.assert_called_once()
+    mock_annot.set_info.assert_called_once_with(content="Wrold")
     mock_annot.update.assert_called_once_with(opacity=0.3)
-    mock_doc.tobytes.assert_called_once()
+    mock_doc.tobytes.assert_called_once_with(deflate=True, use_objstms=1)
+    mock_doc.__exit__.assert_called_once()
+
+
+def test_highlight_is_idempotent(sample_pdf_bytes):
+    pdf = Pdf(io.BytesIO(sample_pdf_bytes))
+    misspellings = pdf.process_pdf({"HELLO", "PAGE", "CONC", "TYP"}, workers=1)
+
+    first = fitz.open(stream=pdf.highlight(misspellings[:1]), filetype="pdf")
+    second = fitz.open(stream=pdf.highlight(misspellings[:1]), filetype="pdf")
+
+    assert len(list(first[0].annots())) == 1
+    assert len(list(second[0].annots())) == 1
+    assert len(list(second[59].annots())) == 1
+
+
+def test_merge_rects():
+    rects = [
+        fitz.Rect(50, 0, 60, 10),  # touches the first word
+        fitz.Rect(0, 0, 50, 10),
+        fitz.Rect(70, 0, 80, 10),  # separated by a space
+        fitz.Rect(0, 5, 20, 15),  # overlaps the merged first word
+    ]
+
+    assert merge_rects(rects) == [fitz.Rect(0, 0, 60, 15), fitz.Rect(70, 0, 80, 10)]
+
+    # The last rect joins the second, and the result reaches back to the first
+    rects = [
+        fitz.Rect(0, 0, 10, 5),
+        fitz.Rect(100, 1, 110, 20),
+        fitz.Rect(5, 10, 105, 12),
+    ]
+    assert merge_rects(rects) == [fitz.Rect(0, 0, 110, 20)]
 
 
 @patch("fitz.open")
@@ -60,9 +138,10 @@ def test_process_pdf(mock_fitz_open, pdf_instance):
     mock_page = MagicMock()
     mock_fitz_open.return_value = mock_doc
     mock_doc.__iter__.return_value = [mock_page]
+    mock_page.read_contents.return_value = b"BT /F1 12 Tf (Hello World) Tj ET"
 
-    # Mock page.get_text to return some test words
-    mock_page.get_text.return_value = [
+    # Mock the page's TextPage to return some test words
+    mock_page.get_textpage.return_value.extractWORDS.return_value = [
         (
             100,
             100,
@@ -87,3 +166,297 @@ def test_process_pdf(mock_fitz_open, pdf_instance):
     assert result[0]["original"] == "Hello"
     assert result[0]["cleaned"] == "HELLO"
     assert result[0]["pages"] == [1]
+
+
+@pytest.fixture
+def sample_pdf_bytes():
+    doc = fitz.open()
+    for page_num in range(60):
+        page = doc.new_page()
+        page.insert_text((50, 50), f"Hello wrold page {page_num}")
+        page.insert_text((50, 80), "CONC (NBCC) TYP. Sheet")
+    return doc.tobytes()
+
+
+def test_shard_pages():
+    shards = _shard_pages(10, 3)
+    assert shards == [range(4), range(4, 7), range(7, 10)]
+    assert _shard_pages(2, 8) == [range(1), range(1, 2)]
+
+
+def test_process_pdf_parallel_matches_serial(sample_pdf_bytes):
+    dictionary = {"HELLO", "PAGE", "CONC", "TYP"}
+
+    serial = Pdf(io.BytesIO(sample_pdf_bytes)).process_pdf(dictionary, workers=1)
+    parallel = Pdf(io.BytesIO(sample_pdf_bytes)).process_pdf(dictionary, workers=2)
+
+    assert [x["original"] for x in parallel] == [x["original"] for x in serial]
+    assert [x["pages"] for x in parallel] == [x["pages"] for x in serial]
+    assert [x["locations"] for x in parallel] == [x["locations"] for x in serial]
+    assert serial[0]["pages"] == list(range(1, 61))
+
+
+def test_iter_misspellings_yields_each_page(sample_pdf_bytes):
+    pdf = Pdf(io.BytesIO(sample_pdf_bytes))
+    results = pdf.iter_misspellings({"HELLO", "PAGE", "CONC", "TYP"}, workers=1)
+
+    page_num, misspelled = next(results)
+    assert page_num == 1
+    assert [entry["pages"] for entry in misspelled.values()] == [[1], [1], [1]]
+    assert [page_num for page_num, _ in results] == list(range(2, 61))
+
+
+def test_merge_results_preserves_page_order():
+    first = _misspelling("Wrold", (1, (1, 2, 3, 4)))
+    second = _misspelling("Wrold", (2, (5, 6, 7, 8)))
+
+    target = {("WROLD", "WROLD"): first}
+    merge_results(target, {("WROLD", "WROLD"): second})
+
+    assert target[("WROLD", "WROLD")]["pages"] == [1, 2]
+    assert target[("WROLD", "WROLD")]["locations"] == [
+        {"page": 0, "bbox": fitz.Rect(1, 2, 3, 4)},
+        {"page": 1, "bbox": fitz.Rect(5, 6, 7, 8)},
+    ]
+
+
+@patch("fitz.open")
+def test_dictionary_switch_reuses_extracted_words(mock_fitz_open, pdf_instance):
+    mock_doc = MagicMock()
+    mock_page = MagicMock()
+    mock_fitz_open.return_value = mock_doc
+    mock_doc.__iter__.return_value = [mock_page]
+    mock_page.read_contents.return_value = b"BT /F1 12 Tf (Hello World) Tj ET"
+    mock_page.get_textpage.return_value.extractWORDS.return_value = [
+        (100, 100, 200, 200, "Hello", 0, 0, 0),
+        (300, 300, 400, 400, "World", 0, 0, 1),
+    ]
+
+    first = pdf_instance.process_pdf({"WORLD"})
+    second = pdf_instance.process_pdf({"HELLO"})
+
+    assert [x["original"] for x in first] == ["Hello"]
+    assert [x["original"] for x in second] == ["World"]
+    mock_page.get_textpage.assert_called_once_with(clip=None, flags=WORD_TEXT_FLAGS)
+
+
+def test_extraction_profile_clips_and_skips_textless_pages():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 50), "Wrold inside")
+    page.insert_text((50, 700), "Border outside")
+    doc.new_page().draw_rect(fitz.Rect(10, 10, 100, 100))
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), False)
+    doc.new_page().insert_image(fitz.Rect(0, 0, 100, 100), pixmap=pix)
+    doc.new_page().add_freetext_annot(fitz.Rect(50, 50, 250, 80), "Wrold texxt")
+    data = doc.tobytes()
+    doc = fitz.open(stream=data)
+
+    assert [draws_text(page) for page in doc] == [True, False, False, True]
+
+    profile = ExtractionProfile(clip=(0, 0, 300, 100))
+    pdf = Pdf(io.BytesIO(data), profile=profile)
+    misspellings = pdf.process_pdf(set(), workers=1)
+
+    assert [x.original for x in misspellings] == ["Wrold", "inside", "texxt"]
+    assert [len(tokens) for tokens in pdf.page_tokens] == [2, 0, 0, 2]
+    assert ExtractionProfile().cache_key() is None
+    assert profile.cache_key() != ExtractionProfile(clip=(0, 0, 300, 200)).cache_key()
+
+
+def test_page_tokens_round_trip():
+    tokens = PageTokens()
+    tokens.append("(NBCC)", "NBCC", (1.0, 2.0, 3.0, 4.0))
+    restored = pickle.loads(pickle.dumps(tokens))
+
+    assert len(restored) == 1
+    assert restored.words == ["(NBCC)"]
+    assert restored.cleaned == ["NBCC"]
+    assert restored.bbox(0) == (1.0, 2.0, 3.0, 4.0)
+    assert list(restored.block_spans()) == [(0, 1)]
+
+
+def test_token_verdicts_memoize_repeated_tokens():
+    tokens = PageTokens()
+    for word in ["CONC", "Wrold", "CONC", "Wrold", "(NBCC)", "CONC"]:
+        tokens.append(word, word.strip("()").upper(), (0, 0, 1, 1))
+
+    verdicts = TokenVerdicts({"CONC"}, max_size=2)
+    misspelled = {}
+    check_tokens(tokens, 1, verdicts, misspelled)
+
+    assert list(misspelled) == [("WROLD", "WROLD"), ("(NBCC)", "NBCC")]
+    assert misspelled[("WROLD", "WROLD")]["pages"] == [1, 1]
+    assert (verdicts.lookups, verdicts.misses, verdicts.hits) == (6, 3, 3)
+    assert verdicts.hit_rate == 0.5
+    # Only the first `max_size` distinct tokens are memoized
+    assert list(verdicts.verdicts) == ["CONC", "Wrold"]
+
+
+def test_repeated_blocks_are_checked_once():
+    verdicts = TokenVerdicts({"CONC", "TYP"})
+    misspelled = {}
+    for page_num, y in ((1, 0), (2, 50)):
+        tokens = PageTokens()
+        tokens.start_block()
+        for x, word in enumerate(["CONC", "Wrold", "TYP"]):
+            tokens.append(word, word.upper(), (x, y, x + 1, y + 1))
+        tokens.start_block()
+        tokens.append(f"Note{page_num}", f"NOTE{page_num}", (0, y + 10, 1, y + 11))
+        check_tokens(tokens, page_num, verdicts, misspelled)
+
+    # The title block is checked on the first page only...
+    assert (verdicts.block_lookups, verdicts.block_misses) == (4, 3)
+    assert verdicts.lookups == 5
+    # ...but every occurrence keeps its own location
+    wrold = misspelled[("WROLD", "WROLD")]
+    assert wrold["pages"] == [1, 2]
+    assert [rect for _, rect in wrold.rects()] == [
+        fitz.Rect(1, 0, 2, 1),
+        fitz.Rect(1, 50, 2, 51),
+    ]
+
+
+def test_split_repeated():
+    entries = [
+        _misspelling(word, *((page_num, (0, 0, 1, 1)) for page_num in pages))
+        for word, pages in (
+            ("Wrold", [1, 2, 3]),
+            ("Nwe", [2]),
+            ("Sheeet", [3, 1, 2, 2]),
+        )
+    ]
+
+    repeated, others = split_repeated(entries, 3)
+
+    assert [x.original for x in repeated] == ["Wrold", "Sheeet"]
+    assert [x.original for x in others] == ["Nwe"]
+    assert split_repeated(entries[1:2], 1) == ([], entries[1:2])
+
+
+def test_misspelling_columnar_record():
+    entry = _misspelling(
+        "Wrold", *((page_num, (10, 20, 30, 40)) for page_num in (3, 1, 3))
+    )
+    restored = pickle.loads(pickle.dumps(entry))
+
+    assert len(restored) == 3
+    assert restored.page_list() == "1, 3"
+    assert restored["original"] == "Wrold"
+    assert restored["pages"] == [3, 1, 3]
+    assert next(restored.rects()) == (2, fitz.Rect(10, 20, 30, 40))
+    assert not hasattr(restored, "__dict__")
+
+
+@pytest.mark.parametrize("incremental", [True, False])
+def test_highlight_to_file(sample_pdf_bytes, tmp_path, incremental):
+    pdf = Pdf(io.BytesIO(sample_pdf_bytes))
+    misspellings = pdf.process_pdf({"HELLO", "PAGE", "CONC", "TYP"}, workers=1)
+
+    path = pdf.highlight_to_file(misspellings, tmp_path / "out.pdf", incremental)
+
+    written = path.read_bytes()
+    # An incremental save only appends to the original file
+    assert written.startswith(sample_pdf_bytes) == incremental
+    with fitz.open(path) as doc:
+        assert [annot.info["content"] for annot in doc[0].annots()] == [
+            x.original for x in misspellings
+        ]
+
+
+def test_pdf_opened_by_path_matches_stream(sample_pdf_bytes, tmp_path):
+    pdf_path = tmp_path / "in.pdf"
+    pdf_path.write_bytes(sample_pdf_bytes)
+    by_path, by_stream = Pdf(path=pdf_path), Pdf(io.BytesIO(sample_pdf_bytes))
+    dictionary = {"HELLO", "PAGE", "CONC", "TYP"}
+
+    assert by_path.digest == by_stream.digest
+    assert [x.original for x in by_path.process_pdf(dictionary, workers=2)] == [
+        x.original for x in by_stream.process_pdf(dictionary, workers=1)
+    ]
+    # The file was never read into memory
+    assert "data" not in vars(by_path)
+
+
+def test_instrumented_run_records_stages(sample_pdf_bytes):
+    with recording() as rec:
+        Pdf(io.BytesIO(sample_pdf_bytes)).process_pdf({"HELLO"}, workers=2)
+
+    stages = rec.stages()
+    # Per-page spans come back from the pool workers
+    assert stages["extract_page"]["calls"] == 60
+    assert stages["check_page"]["calls"] == 60
+    assert rec.counters["tokens"] == sum(
+        rec.counters[k] for k in ("token_memo.hits", "token_memo.misses")
+    )
+    assert 0 < rec.hit_ratios()["token_memo"] < 1
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("12-18, 40", [12, 13, 14, 15, 16, 17, 18, 40]),
+        ("3,1, 2-3", [1, 2, 3]),
+        (" 5 ", [5]),
+        ("", []),
+    ],
+)
+def test_parse_page_ranges(text, expected):
+    assert parse_page_ranges(text, page_count=60) == expected
+
+
+@pytest.mark.parametrize("text", ["abc", "5-2", "0", "59-61", "1-2-3"])
+def test_parse_page_ranges_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        parse_page_ranges(text, page_count=60)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_process_pdf_only_extracts_selected_pages(sample_pdf_bytes, workers):
+    pdf = Pdf(io.BytesIO(sample_pdf_bytes))
+    selected = parse_page_ranges("3-55", pdf.page_count)
+
+    result = pdf.process_pdf({"HELLO"}, workers=workers, pages=selected)
+
+    assert result[0]["pages"] == selected
+    assert pdf.pages_extracted == len(selected)
+    assert [idx + 1 for idx, t in enumerate(pdf.page_tokens) if t] == selected
+
+    # A later full pass only extracts the pages it has not seen yet
+    full = pdf.process_pdf({"HELLO"}, workers=workers)
+    assert full[0]["pages"] == list(range(1, 61))
+    assert pdf.pages_extracted == 60
+
+
+def _revision(changed_page: int | None = None) -> bytes:
+    doc = fitz.open()
+    for page_num in range(1, 7):
+        page = doc.new_page()
+        page.insert_text((50, 50), f"Hello wrold page {page_num}")
+        if page_num == changed_page:
+            page.insert_text((50, 80), "Revised nwe note")
+    return doc.tobytes()
+
+
+def test_reuse_page_tokens_only_extracts_changed_pages():
+    rev_a = Pdf(io.BytesIO(_revision()))
+    rev_a.process_pdf({"HELLO", "PAGE"}, workers=1)
+    known = dict(zip(rev_a.fingerprints, rev_a.page_tokens))
+
+    rev_b = Pdf(io.BytesIO(_revision(changed_page=4)))
+    assert rev_b.reuse_page_tokens(known.get) == [4]
+    result = rev_b.process_pdf({"HELLO", "PAGE"}, workers=1)
+
+    assert rev_b.pages_extracted == 1
+    fresh = Pdf(io.BytesIO(_revision(changed_page=4))).process_pdf(
+        {"HELLO", "PAGE"}, workers=1
+    )
+    assert [(x.original, x["pages"]) for x in result] == [
+        (x.original, x["pages"]) for x in fresh
+    ]
+    assert [x.only_on_pages({4}) for x in result] == [False, True, True, True]
+
+
+@pytest.mark.parametrize("pages", [[1, 2, 3, 5, 9, 10], [4], []])
+def test_format_page_ranges_round_trip(pages):
+    assert parse_page_ranges(format_page_ranges(pages), page_count=10) == pages
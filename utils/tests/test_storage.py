@@ -0,0 +1,77 @@
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+from utils import storage
+from utils.cache import ResultCache
+from utils.dictionary import compile_dictionary
+
+
+@pytest.fixture(autouse=True)
+def temp_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "TEMP_DIR", tmp_path / "temp")
+    return tmp_path / "temp"
+
+
+def test_new_temp_path(temp_dir):
+    first, second = storage.new_temp_path(".pdf"), storage.new_temp_path(".pdf")
+
+    assert first != second
+    assert first.parent == temp_dir
+    assert first.suffix == ".pdf"
+    assert temp_dir.is_dir()
+
+
+def test_cleanup_temp_files_removes_only_old_files():
+    old, new = storage.new_temp_path(), storage.new_temp_path()
+    old.write_bytes(b"old")
+    new.write_bytes(b"new")
+    an_hour_ago = time.time() - 3600
+    os.utime(old, (an_hour_ago, an_hour_ago))
+
+    assert storage.cleanup_temp_files(max_age=60) == 1
+    assert not old.exists()
+    assert new.exists()
+
+
+def test_spool_upload_is_content_addressed(temp_dir):
+    digest, path = storage.spool_upload(io.BytesIO(b"%PDF-1.7 one"), chunk_size=4)
+    again, same_path = storage.spool_upload(io.BytesIO(b"%PDF-1.7 one"))
+    _, other_path = storage.spool_upload(io.BytesIO(b"%PDF-1.7 two"))
+
+    assert digest == hashlib.sha256(b"%PDF-1.7 one").hexdigest() == again
+    assert path == same_path != other_path
+    assert path.read_bytes() == b"%PDF-1.7 one"
+    assert sorted(p.name for p in path.parent.iterdir()) == sorted(
+        [path.name, other_path.name]
+    )
+
+
+def test_cleanup_keeps_recent_uploads():
+    _, upload = storage.spool_upload(io.BytesIO(b"upload"))
+    two_hours_ago = time.time() - 2 * 3600
+    os.utime(upload, (two_hours_ago, two_hours_ago))
+
+    assert storage.cleanup_temp_files(max_age=60) == 0
+    assert storage.cleanup_temp_files(max_age=60, upload_max_age=60) == 1
+    assert not upload.exists()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX file modes")
+def test_renamed_files_get_default_permissions(temp_dir, tmp_path):
+    umask = os.umask(0o022)
+    try:
+        _, upload = storage.spool_upload(io.BytesIO(b"%PDF-1.7"))
+        cache = ResultCache(tmp_path / "cache")
+        cache.put("key", [1, 2])
+        dict_file = tmp_path / "words.txt"
+        dict_file.write_text("HELLO\n", encoding="utf-8")
+        index_path = compile_dictionary(dict_file)
+    finally:
+        os.umask(umask)
+
+    for path in (upload, cache._path("key"), index_path):
+        assert path.stat().st_mode & 0o777 == 0o644
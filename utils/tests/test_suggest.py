@@ -0,0 +1,71 @@
+import pytest
+
+from utils.dictionary import add_words, load_compiled_dictionaries
+from utils.suggest import _candidates, compile_suggestions, edit_distance, suggest
+
+WORDS = [
+    "CONCRETE", "CONCRETES", "CONCERT", "REINFORCEMENT", "REINFORCE",
+    "FOUNDATION", "WORLD", "WORD", "WOLD", "TYPICAL", "TYP", "ANCHOR",
+]  # fmt: skip
+
+
+@pytest.fixture
+def dict_file(tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_text("\n".join(WORDS) + "\n", encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize(
+    "a, b, expected",
+    [
+        ("WORLD", "WORLD", 0),
+        ("WROLD", "WORLD", 1),  # transposition
+        ("CONCRTE", "CONCRETE", 1),  # insertion
+        ("FOUNDATOIN", "FOUNDATION", 1),
+        ("REINFORCMENT", "REINFORCEMENT", 1),
+        ("ANCHR", "ANCHOR", 1),
+        ("WORLD", "WOLD", 1),
+        ("CONCRETE", "CONCERT", 2),
+        ("CONCRETE", "ANCHOR", 3),  # more than max_distance
+        ("ABCDEF", "ABXYEF", 2),
+        ("AB", "ABCD", 2),
+        ("AB", "ABCDE", 3),
+    ],
+)
+def test_edit_distance(a, b, expected):
+    assert edit_distance(a.encode(), b.encode(), max_distance=2) == expected
+
+
+def test_suggest_ranks_closest_first(dict_file):
+    dictionary = load_compiled_dictionaries([dict_file])
+
+    assert suggest(dictionary, "CONCRTE") == ["CONCRETE", "CONCERT", "CONCRETES"]
+    assert suggest(dictionary, "REINFORCMENT") == ["REINFORCEMENT"]
+    assert suggest(dictionary, "WROLD", top=2) == ["WORLD", "WOLD"]
+    assert suggest(dictionary, "XYZZY") == []
+    # Short words are only matched one edit away
+    assert suggest(dictionary, "TIP") == ["TYP"]
+
+
+def test_suggestions_follow_dictionary_updates(dict_file):
+    old_index = load_compiled_dictionaries([dict_file]).indexes[0].path
+    old_suggestions = compile_suggestions(old_index)
+
+    add_words(dict_file, ["SPELLING"])
+    dictionary = load_compiled_dictionaries([dict_file])
+
+    assert not old_suggestions.exists()
+    assert suggest(dictionary, "SPELING") == ["SPELLING"]
+
+
+def test_changing_the_selection_reuses_candidates(dict_file, tmp_path):
+    other_file = tmp_path / "other.txt"
+    other_file.write_text("WORLDS\n", encoding="utf-8")
+    suggest(load_compiled_dictionaries([dict_file]), "WROLD")
+
+    misses = _candidates.cache_info().misses
+    dictionary = load_compiled_dictionaries([dict_file, other_file])
+    assert suggest(dictionary, "WROLD") == ["WORLD", "WOLD", "WORD"]
+    # Only the newly selected dictionary is looked up
+    assert _candidates.cache_info().misses == misses + 1
@@ -0,0 +1,194 @@
+"""Streamlit adapter shared by the apps
+
+The spell-check core (`utils.pdf`, `utils.dictionary`, `utils.cache`, ...)
+never imports Streamlit; this module wires it into the apps: process-wide
+resources through `st.cache_resource`, background jobs, and the
+diagnostics panel.
+"""
+
+import io
+import time
+from collections.abc import Callable, Container
+from typing import Any
+
+import pandas as pd
+import streamlit as st
+
+from utils.cache import Cache, ResultCache
+from utils.instrument import Recorder, recorder, set_recorder
+from utils.jobs import Job, check_document, job_queue
+from utils.pdf import Misspelling, Pdf
+
+# Seconds between reruns while waiting for a background job
+JOB_POLL_INTERVAL: float = 0.5
+
+
+@st.cache_resource
+def shared_result_cache() -> ResultCache:
+    """The on-disk result cache, shared by every session of the server"""
+    return ResultCache()
+
+
+def run_job(
+    key: str,
+    fn: Callable[..., Any],
+    *args,
+    show_partial: Callable[[Any], None] | None = None,
+) -> Job:
+    """Run `fn(job, *args)` as the shared job `key` and wait for it across reruns
+
+    Jobs are shared by every session, so reruns (any widget change) neither
+    block on nor cancel the work. Until the job finishes, this shows its
+    progress and, with `show_partial`, its partial results, then reruns the
+    script. A failed job shows its error and a Retry button. Returns the
+    finished job. Its stage timings are merged into the recorder of the first
+    run with diagnostics on that finds it finished, labelled "job: ".
+    """
+    job = job_queue().get(key)
+    if job is not None and job.status == "failed":
+        st.error(f"Checking failed: {job.error}")
+        if not st.button("Retry"):
+            st.stop()
+    job = job_queue().submit(key, fn, *args)
+    if not job.finished:
+        st.progress(job.fraction, text=job.message or "Waiting to start...")
+        if show_partial is not None and job.partial:
+            show_partial(job.partial)
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+    if job.status == "failed":
+        st.rerun()
+    # Add the job's stages to diagnostics once per session, not on every
+    # rerun that finds the finished job.
+    merged_jobs: set[tuple[str, float]] = st.session_state.setdefault(
+        "merged_jobs", set()
+    )
+    if recorder().enabled and (job.key, job.submitted_at) not in merged_jobs:
+        merged_jobs.add((job.key, job.submitted_at))
+        recorder().merge(job.recorder, prefix="job: ")
+    return job
+
+
+def document_results(
+    pdf: Pdf,
+    dictionary: Container[str],
+    pages: list[int] | None,
+    cache: Cache,
+    cache_key: str,
+    partial_columns: dict[str, Callable[[Misspelling], Any]],
+    suggestions_key: str | None = None,
+) -> list[Misspelling]:
+    """Misspelled words of `pdf`, from `cache` or a background `check_document`
+
+    While the check runs, the words found so far are shown as a table with
+    `partial_columns` (column name -> value of a row). With `suggestions_key`,
+    the job also stores suggestions for the words in `cache` under that key.
+    Sets `pdf.changed_pages` when the job compared the pages with earlier
+    uploads.
+    """
+    job_key = suggestions_key or cache_key
+    if job_queue().get(job_key) is None and (
+        suggestions_key is None or suggestions_key in cache
+    ):
+        misspelled_words = cache.get(cache_key)
+        if misspelled_words is not None:
+            return misspelled_words
+
+    def show_partial(partial: list[Misspelling]):
+        st.dataframe(
+            pd.DataFrame(
+                {
+                    name: [column(x) for x in partial]
+                    for name, column in partial_columns.items()
+                }
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    job = run_job(
+        job_key,
+        check_document,
+        pdf.path,
+        pdf.digest,
+        dictionary,
+        pages,
+        cache,
+        cache_key,
+        suggestions_key,
+        show_partial=show_partial,
+    )
+    [misspelled_words] = job_results(job, cache, [cache_key])
+    if job.result is not None:
+        pdf.changed_pages = job.result
+    return misspelled_words
+
+
+def job_results(job: Job, cache: Cache, keys: list[str]) -> list[Any]:
+    """The values a finished `job` stored in `cache` under `keys`
+
+    If one was evicted since, the job is forgotten and the script reruns, so
+    the work is submitted again.
+    """
+    values = [cache.get(key) for key in keys]
+    if any(value is None for value in values):
+        job_queue().forget(job.key)
+        st.rerun()
+    return values
+
+
+def diagnostics_toggle() -> Recorder | None:
+    """Sidebar toggle; records this run's stages into the returned recorder"""
+    diagnostics = (
+        Recorder()
+        if st.sidebar.toggle(
+            "Diagnostics",
+            help="Record how long each processing stage takes. Results already "
+            "in the cache are not re-checked, so clear it to time a full run.",
+        )
+        else None
+    )
+    set_recorder(diagnostics)
+    return diagnostics
+
+
+def show_diagnostics(diagnostics: Recorder):
+    """Sidebar panel with this run's stage timings and counters"""
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        stages = diagnostics.stages()
+        st.dataframe(
+            pd.DataFrame(
+                {
+                    "Stage": list(stages),
+                    "Calls": [x["calls"] for x in stages.values()],
+                    "Time (ms)": [
+                        round(x["seconds"] * 1e3, 1) for x in stages.values()
+                    ],
+                }
+            ),
+            hide_index=True,
+        )
+        st.caption(
+            " · ".join(
+                f"{name}: {value:,}" for name, value in diagnostics.counters.items()
+            )
+        )
+        st.caption(
+            " · ".join(
+                f"{name} hit ratio: {ratio:.0%}"
+                for name, ratio in diagnostics.hit_ratios().items()
+            )
+        )
+        report, trace = io.StringIO(), io.StringIO()
+        diagnostics.write_json(report)
+        diagnostics.write_chrome_trace(trace)
+        st.download_button(
+            "Download JSON", report.getvalue(), "diagnostics.json", "application/json"
+        )
+        st.download_button(
+            "Download Chrome trace",
+            trace.getvalue(),
+            "trace.json",
+            "application/json",
+            help="Open in chrome://tracing or ui.perfetto.dev",
+        )